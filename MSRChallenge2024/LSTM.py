@@ -1,80 +1,64 @@
+import argparse
 import os
-import json
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error
-from dateutil.parser import parse
-import re
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from sklearn.metrics import mean_absolute_error, mean_squared_error, root_mean_squared_error
 
+from cvss import COLUMN_INDEX, advisory_vector, vector_columns
+from dateparse import to_datetime
+from loader import load_json_files
+from patchmodel import DEFAULT_MODEL_PATH, save_model
+from rejectlog import DEFAULT_REJECT_LOG, RejectLog
+
+# Batches kept in the shuffle buffer when training from a cached dataset
+SHUFFLE_BATCHES = 256
+
+
 def load_data(directory):
     """Load JSON files from the specified directory."""
-    data_list = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".json"):
-            filepath = os.path.join(directory, filename)
-            try:
-                with open(filepath, "r") as file:
-                    data = json.load(file)
-                    if isinstance(data, list):  # Ensure it's a list of dictionaries
-                        data_list.extend(data)
-                    elif isinstance(data, dict):
-                        data_list.append(data)
-                    else:
-                        print(f"Skipping invalid JSON structure in {filename}")
-            except Exception as e:
-                print(f"Error loading {filename}: {e}")
+    data_list, errors = load_json_files(directory, flatten=True,
+                                       fields="id, published, affected.ranges.events, affected.versions, severity")
+    for filepath, error in errors:
+        print(f"Error loading {os.path.basename(filepath)}: {error}")
     return data_list
 
 
 
 def convert_to_datetime(date_str):
-    """Convert a string to offset-naive datetime or return None for invalid formats."""
-    try:
-        # Parse the date string and strip timezone info
-        dt = parse(date_str, fuzzy=True)
-        return dt.replace(tzinfo=None)
-    except ValueError:
-        pass
-
-    # Handle common patterns
-    if re.match(r'^\d+(\.\d+)+(\.Final)?$', date_str):
-        print(f"Unrecognized date format (likely a version): {date_str}. Skipping.")
-        return None
-
-    if re.match(r'^\d+\.\d+\.\d+\.\w+\d+$', date_str):
-        print(f"Date format with version suffix: {date_str}. Skipping.")
-        return None
+    """Convert a string to offset-naive datetime or return None for versions and invalid formats."""
+    return to_datetime(date_str)
 
-    if re.match(r'^\d+\.\d+\.\d+-rc-\d+$', date_str):
-        print(f"Date format with release candidate: {date_str}. Skipping.")
-        return None
 
-    print(f"Unrecognized date format: {date_str}. Skipping.")
-    return None
+def latest_published(data_list):
+    """The latest published date of a list of advisories, as an ISO string (None if none has one)."""
+    dates = [date for date in (to_datetime(entry.get("published")) for entry in data_list) if date]
+    return max(dates).isoformat() if dates else None
 
 
-def log_skipped_entries(entry_id, reason, log_file="skipped_entries.log"):
-    """Log skipped entries with the reason."""
-    with open(log_file, "a") as file:
-        file.write(f"Entry ID: {entry_id}, Reason: {reason}\n")
+def extract_patch_times(data_list, log_file=DEFAULT_REJECT_LOG):
+    """Extract patch times and features from data; skipped entries go to the reject log."""
+    with RejectLog(log_file, source="LSTM") as reject_log:
+        return extract_features(data_list, reject_log)
 
 
-def extract_patch_times(data_list, log_file="skipped_entries.log"):
-    """Extract patch times and features from data."""
+def extract_features(data_list, reject_log):
+    """Extract patch times and features from data, recording skipped entries in reject_log."""
     patch_times = []
-    features = []
+    versions_lengths = []
+    vectors = []  # (id, CVSS vector or None) of every kept entry
     for entry in data_list:
         entry_id = entry.get('id', 'Unknown')
         try:
             published_date = convert_to_datetime(entry.get("published"))
             if not published_date:
-                log_skipped_entries(entry_id, "Invalid or missing published date", log_file)
+                reject_log.add(entry_id, "Invalid or missing published date")
                 continue
 
             fixed_dates = []
@@ -88,78 +72,107 @@ def extract_patch_times(data_list, log_file="skipped_entries.log"):
                                     fixed_dates.append(date)
 
             if not fixed_dates:
-                log_skipped_entries(entry_id, "No valid fixed dates", log_file)
+                reject_log.add(entry_id, "No valid fixed dates")
                 continue
 
             fixed_date = min(fixed_dates)
             if fixed_date <= published_date:
-                log_skipped_entries(entry_id, f"Fixed date ({fixed_date}) before published date ({published_date})", log_file)
+                reject_log.add(entry_id, "Fixed date before published date",
+                               fixed=str(fixed_date), published=str(published_date))
                 continue
 
             patch_time = (fixed_date - published_date).total_seconds() / (60 * 60)
             patch_times.append(patch_time)
 
-            severity_score = 0
-            for severity_info in entry.get("severity", []):
-                if severity_info["type"] == "CVSS_V3":
-                    try:
-                        severity_score = float(severity_info["score"].split("/")[1].split(":")[1])
-                    except (IndexError, ValueError):
-                        severity_score = np.nan
-                        log_skipped_entries(entry_id, "Invalid severity score", log_file)
-
             versions_length = sum(len(item.get("versions", [])) for item in entry.get("affected", []))
-            features.append([severity_score if not np.isnan(severity_score) else 0, versions_length])
+            versions_lengths.append(versions_length)
+            vectors.append((entry_id, advisory_vector(entry)))
 
         except Exception as e:
-            log_skipped_entries(entry_id, f"Processing error: {e}", log_file)
+            reject_log.add(entry_id, "Processing error", error=str(e))
             continue
 
+    # Score the CVSS vectors of the kept entries in one pass (each distinct vector is parsed once)
+    columns = vector_columns([vector for _, vector in vectors])
+    for (entry_id, vector), version in zip(vectors, columns[:, COLUMN_INDEX["version"]]):
+        if vector and np.isnan(version):
+            reject_log.add(entry_id, "Invalid severity score", vector=vector)
+    severity_scores = np.nan_to_num(columns[:, COLUMN_INDEX["base_score"]], nan=0.0)
+    features = np.column_stack([severity_scores, np.array(versions_lengths, dtype=float)])
+
     # Handle missing values in patch times
     patch_times = pd.Series(patch_times).interpolate().tolist()
-    return np.array(features), np.array(patch_times)
+    return features, np.array(patch_times)
 
 
 def create_sequences(data, target, sequence_length):
-    """Create sequences for LSTM input."""
+    """Create sequences for LSTM input as read-only strided views of data (nothing is copied)."""
     if len(data) < sequence_length:
         print(f"Not enough data to form sequences. Adjusting sequence length to {len(data)}.")
         sequence_length = len(data)
 
-    sequences = []
-    targets = []
-    for i in range(len(data) - sequence_length):
-        seq = data[i:i + sequence_length]
-        label = target[i + sequence_length]
-        sequences.append(seq)
-        targets.append(label)
-    return np.array(sequences), np.array(targets)
-
-
-def build_lstm_model(input_shape):
-    """Build and compile an LSTM model."""
-    model = Sequential([
-        tf.keras.Input(shape=input_shape),  # Specify input shape directly
-        LSTM(64, return_sequences=True),
-        Dropout(0.2),
-        LSTM(32, return_sequences=False),
-        Dropout(0.2),
-        Dense(1)  # Output layer for regression
-    ])
+    # Window i is data[i:i + sequence_length] and is labelled with the target of its last row, so an
+    # advisory's own features are part of its window (as in patchmodel.PatchTimeModel)
+    windows = sliding_window_view(data, sequence_length, axis=0).swapaxes(1, 2)
+    return windows, target[sequence_length - 1:]
+
+
+def window_dataset(windows, targets, batch_size, shuffle=False, cache=None, seed=0):
+    """Stream (window, target) batches to Keras, only copying one batch of windows at a time.
+
+    cache names a file to keep the batches in after the first pass ("" keeps them
+    in memory); shuffled cached batches are reshuffled by batch each epoch.
+    """
+    rng = np.random.default_rng(seed)
+
+    def batches():
+        order = np.arange(len(windows))
+        if shuffle and cache is None:
+            rng.shuffle(order)
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            yield windows[index].astype(np.float32), targets[index].astype(np.float32)
+
+    signature = (tf.TensorSpec(shape=(None,) + windows.shape[1:], dtype=tf.float32),
+                 tf.TensorSpec(shape=(None,) + targets.shape[1:], dtype=tf.float32))
+    dataset = tf.data.Dataset.from_generator(batches, output_signature=signature)
+    if cache is not None:
+        dataset = dataset.cache(cache)
+        if shuffle:
+            dataset = dataset.shuffle(SHUFFLE_BATCHES, seed=seed, reshuffle_each_iteration=True)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def build_lstm_model(input_shape, units=(64, 32), dropout=0.2):
+    """Build and compile a stacked LSTM model with the given layer sizes."""
+    layers = [tf.keras.Input(shape=input_shape)]  # Specify input shape directly
+    for i, size in enumerate(units):
+        layers.append(LSTM(size, return_sequences=i < len(units) - 1))
+        layers.append(Dropout(dropout))
+    layers.append(Dense(1))  # Output layer for regression
+    model = Sequential(layers)
     model.compile(optimizer='adam', loss='mse', metrics=['mae'])
     return model
 
 
-def train_and_evaluate(features, patch_times, sequence_length=5, epochs=50, batch_size=16):
-    """Train and evaluate an LSTM model or fallback model."""
+def train_and_evaluate(features, patch_times, sequence_length=5, epochs=50, batch_size=16, cache=None,
+                       model_path=None, trained_until=None):
+    """Train and evaluate an LSTM model or fallback model, streaming the windows through tf.data.
+
+    With model_path the trained model and its scalers are saved there for patchmodel.PatchTimeModel;
+    trained_until (the latest published date of the training data) lets forecast.py check that a
+    backtest only scores the model on months it has not seen.
+    """
     if len(patch_times) <= sequence_length:
         print("Not enough data for LSTM. Falling back to simpler model...")
         fallback_model(features, patch_times)
         return
 
-    scaler = MinMaxScaler()
-    features_scaled = scaler.fit_transform(features)
-    patch_times_scaled = scaler.fit_transform(patch_times.reshape(-1, 1))
+    # Features and target get their own scalers so neither clobbers the other
+    feature_scaler = MinMaxScaler()
+    target_scaler = MinMaxScaler()
+    features_scaled = feature_scaler.fit_transform(features)
+    patch_times_scaled = target_scaler.fit_transform(patch_times.reshape(-1, 1))
 
     X, y = create_sequences(features_scaled, patch_times_scaled, sequence_length)
     if len(X) == 0:
@@ -170,15 +183,16 @@ def train_and_evaluate(features, patch_times, sequence_length=5, epochs=50, batc
     split = int(0.8 * len(X))
     X_train, X_test = X[:split], X[split:]
     y_train, y_test = y[:split], y[split:]
+    train_data = window_dataset(X_train, y_train, batch_size, shuffle=True, cache=cache and f"{cache}.train")
+    test_data = window_dataset(X_test, y_test, batch_size, cache=cache and f"{cache}.test")
 
     model = build_lstm_model(input_shape=(X_train.shape[1], X_train.shape[2]))
-    history = model.fit(X_train, y_train, validation_data=(X_test, y_test), epochs=epochs, batch_size=batch_size)
+    history = model.fit(train_data, validation_data=test_data, epochs=epochs)
 
     # Evaluate model performance
-    # Evaluate model performance
-    predictions = model.predict(X_test)
-    predictions_rescaled = scaler.inverse_transform(predictions)
-    y_test_rescaled = scaler.inverse_transform(y_test.reshape(-1, 1))
+    predictions = model.predict(test_data)
+    predictions_rescaled = target_scaler.inverse_transform(predictions)
+    y_test_rescaled = target_scaler.inverse_transform(y_test.reshape(-1, 1))
 
     # Calculate evaluation metrics
     mae = mean_absolute_error(y_test_rescaled, predictions_rescaled)
@@ -186,6 +200,11 @@ def train_and_evaluate(features, patch_times, sequence_length=5, epochs=50, batc
     print(f"Mean Absolute Error: {mae}")
     print(f"Root Mean Squared Error: {rmse}")
 
+    if model_path:
+        save_model(model_path, model, feature_scaler, target_scaler, sequence_length, features_scaled,
+                   mae=float(mae), rmse=float(rmse), training_samples=len(features), trained_until=trained_until)
+        print(f"Saved model to {model_path}")
+
     # Calculate predicted average patch time
     predicted_avg_patch_time = np.mean(predictions_rescaled)
     print(f"Predicted Average Patch Time: {predicted_avg_patch_time:.2f} hours")
@@ -213,9 +232,10 @@ def fallback_model(features, patch_times):
         print("Insufficient data for fallback model. Exiting...")
         return
 
-    scaler = MinMaxScaler()
-    features_scaled = scaler.fit_transform(features)
-    patch_times_scaled = scaler.fit_transform(patch_times.reshape(-1, 1))
+    feature_scaler = MinMaxScaler()
+    target_scaler = MinMaxScaler()
+    features_scaled = feature_scaler.fit_transform(features)
+    patch_times_scaled = target_scaler.fit_transform(patch_times.reshape(-1, 1))
 
     from sklearn.linear_model import LinearRegression
     model = LinearRegression()
@@ -223,15 +243,28 @@ def fallback_model(features, patch_times):
 
     predictions = model.predict(features_scaled)
     plt.figure(figsize=(10, 6))
-    plt.plot(scaler.inverse_transform(patch_times_scaled), label="Actual Patch Times")
-    plt.plot(scaler.inverse_transform(predictions), label="Predicted Patch Times", linestyle="dashed")
+    plt.plot(target_scaler.inverse_transform(patch_times_scaled), label="Actual Patch Times")
+    plt.plot(target_scaler.inverse_transform(predictions), label="Predicted Patch Times", linestyle="dashed")
     plt.legend()
     plt.title("Fallback Model: Linear Regression Results")
     plt.show()
 
 if __name__ == "__main__":
-    data_directory = "/Users/jaydencruz/PycharmProjects/MSRChallenge/Kimberly'sFiles2"
-    data_list = load_data(data_directory)
+    parser = argparse.ArgumentParser(description="Train the patch-time LSTM and save it for patchmodel.py.")
+    parser.add_argument("source", nargs="?",
+                        default="/Users/jaydencruz/PycharmProjects/MSRChallenge/Kimberly'sFiles2",
+                        help="Folder, glob, zip or advisory store to train on")
+    parser.add_argument("--before", default=None,
+                        help="only train on advisories published before this date (e.g. 2023-01-01), so forecast.py "
+                             "can backtest the model on the months after it")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="artifact folder to save the model to")
+    args = parser.parse_args()
+    data_list = load_data(args.source)
+    if args.before:
+        cutoff = to_datetime(args.before)
+        if cutoff is None:
+            parser.error(f"--before {args.before!r} is not a date")
+        data_list = [entry for entry in data_list if (to_datetime(entry.get("published")) or cutoff) < cutoff]
 
     features, patch_times = extract_patch_times(data_list)
     if len(patch_times) > 0:
@@ -240,4 +273,5 @@ if __name__ == "__main__":
     else:
         print("No valid patch times found.")
 
-    train_and_evaluate(features, patch_times)
\ No newline at end of file
+    train_and_evaluate(features, patch_times, model_path=args.model,
+                       trained_until=latest_published(data_list))
\ No newline at end of file
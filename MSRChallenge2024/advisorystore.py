@@ -0,0 +1,299 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from decoding import parse_projection, project
+from loader import load_json_files
+from sharding import shard_of
+
+# The store is a folder of .npy columns plus a small meta.json. Text columns are kept
+# as one UTF-8 byte blob with an offsets array, and nested lists (aliases, affected ->
+# ranges -> events, ...) as offsets into their child column, so nothing but the
+# fields the analyses read is ever materialised.
+STORE_FORMAT = 2
+META_FILE = "meta.json"
+
+# GitHub's levels; MEDIUM (the CVSS rating name) is stored as MODERATE so each level has one code
+SEVERITY_LEVELS = ["", "LOW", "MODERATE", "HIGH", "CRITICAL"]
+SEVERITY_ALIASES = {"MEDIUM": "MODERATE"}
+EVENT_KINDS = ["introduced", "fixed", "last_affected", "limit"]
+DATE_FIELDS = ["published", "modified", "nvd_published_at", "github_reviewed_at"]
+TEXT_FIELDS = ["id", "summary", "details"]
+
+
+def is_store(path):
+    """Checks whether a path is an advisory store folder."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def parse_date(timestamp):
+    """Converts an ISO timestamp to milliseconds since the epoch (None if invalid)."""
+    if not isinstance(timestamp, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def format_date(value):
+    """Converts a datetime64[ms] value back to the OSV timestamp format."""
+    if np.isnat(value):
+        return None
+    unit = "ms" if value.astype(np.int64) % 1000 else "s"
+    return np.datetime_as_string(value, unit=unit) + "Z"
+
+
+class StringColumn:
+    """Collects strings and encodes them as an offsets array plus a UTF-8 blob."""
+
+    def __init__(self):
+        self.lengths = []
+        self.chunks = []
+
+    def append(self, value):
+        data = (value or "").encode("utf-8")
+        self.lengths.append(len(data))
+        self.chunks.append(data)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def arrays(self):
+        offsets = np.zeros(len(self.lengths) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=offsets[1:])
+        blob = np.frombuffer(b"".join(self.chunks), dtype=np.uint8)
+        return offsets, blob
+
+
+def list_offsets(lengths):
+    """Builds the offsets array of a nested list column from its per-row lengths."""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def build_store(data_list, store_path):
+    """Flattens a list of OSV advisories into a columnar store and returns its size."""
+    texts = {field: StringColumn() for field in TEXT_FIELDS}
+    dates = {field: [] for field in DATE_FIELDS}
+    severity_codes = []
+    lists = {name: ([], StringColumn()) for name in ["aliases", "cwe_ids", "severity_type", "severity_score"]}
+
+    affected_lengths, packages, version_lengths, versions = [], StringColumn(), [], StringColumn()
+    range_lengths, range_types = [], StringColumn()
+    event_lengths, event_kinds, event_values = [], [], StringColumn()
+
+    for entry in data_list:
+        database_specific = entry.get("database_specific") or {}
+        for field in TEXT_FIELDS:
+            texts[field].append(entry.get(field))
+        for field in DATE_FIELDS:
+            value = entry.get(field) if field in ["published", "modified"] else database_specific.get(field)
+            dates[field].append(parse_date(value))
+
+        severity = database_specific.get("severity")
+        severity = severity.upper() if isinstance(severity, str) else ""
+        severity = SEVERITY_ALIASES.get(severity, severity)
+        severity_codes.append(SEVERITY_LEVELS.index(severity) if severity in SEVERITY_LEVELS else 0)
+
+        severity_info = entry.get("severity") or []
+        row_lists = {
+            "aliases": entry.get("aliases") or [],
+            "cwe_ids": database_specific.get("cwe_ids") or [],
+            "severity_type": [item.get("type") for item in severity_info],
+            "severity_score": [item.get("score") for item in severity_info],
+        }
+        for name, values in row_lists.items():
+            lengths, column = lists[name]
+            lengths.append(len(values))
+            for value in values:
+                column.append(value)
+
+        affected = entry.get("affected") or []
+        affected_lengths.append(len(affected))
+        for item in affected:
+            packages.append((item.get("package") or {}).get("name"))
+            item_versions = item.get("versions") or []
+            version_lengths.append(len(item_versions))
+            for version in item_versions:
+                versions.append(version)
+
+            ranges = item.get("ranges") or []
+            range_lengths.append(len(ranges))
+            for range_info in ranges:
+                range_types.append(range_info.get("type"))
+                events = [(kind, value) for event in range_info.get("events", [])
+                          for kind, value in event.items() if kind in EVENT_KINDS]
+                event_lengths.append(len(events))
+                for kind, value in events:
+                    event_kinds.append(EVENT_KINDS.index(kind))
+                    event_values.append(value)
+
+    columns = {}
+    for field, column in texts.items():
+        columns[field + ".offsets"], columns[field + ".blob"] = column.arrays()
+    for field, values in dates.items():
+        millis = np.array([np.iinfo(np.int64).min if v is None else v for v in values], dtype=np.int64)
+        columns[field] = millis.view("datetime64[ms]")
+    columns["severity"] = np.array(severity_codes, dtype=np.uint8)
+    for name, (lengths, column) in lists.items():
+        columns[name + ".lists"] = list_offsets(lengths)
+        columns[name + ".offsets"], columns[name + ".blob"] = column.arrays()
+
+    columns["affected.lists"] = list_offsets(affected_lengths)
+    columns["package.offsets"], columns["package.blob"] = packages.arrays()
+    columns["versions.lists"] = list_offsets(version_lengths)
+    columns["versions.offsets"], columns["versions.blob"] = versions.arrays()
+    columns["ranges.lists"] = list_offsets(range_lengths)
+    columns["range_type.offsets"], columns["range_type.blob"] = range_types.arrays()
+    columns["events.lists"] = list_offsets(event_lengths)
+    columns["event_kind"] = np.array(event_kinds, dtype=np.uint8)
+    columns["event_value.offsets"], columns["event_value.blob"] = event_values.arrays()
+
+    os.makedirs(store_path, exist_ok=True)
+    for name, array in columns.items():
+        np.save(os.path.join(store_path, name + ".npy"), array)
+    with open(os.path.join(store_path, META_FILE), "w") as f:
+        json.dump({"format": STORE_FORMAT, "count": len(severity_codes), "columns": sorted(columns)}, f, indent=2)
+    return len(severity_codes)
+
+
+def ingest(source, store_path, workers=None):
+    """Parses a folder of advisory JSON files and writes them to a store, returning the load errors."""
+    data_list, errors = load_json_files(source, workers=workers, flatten=True)
+    build_store(data_list, store_path)
+    return errors
+
+
+class AdvisoryStore:
+    """Read-only, memory-mapped view over a store written by build_store."""
+
+    def __init__(self, store_path):
+        with open(os.path.join(store_path, META_FILE), "r") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported advisory store format in {store_path}: {meta.get('format')}")
+        self.path = store_path
+        self.count = meta["count"]
+        self.columns = {}
+        for name in meta["columns"]:
+            file_path = os.path.join(store_path, name + ".npy")
+            try:
+                self.columns[name] = np.load(file_path, mmap_mode="r")
+            except ValueError:
+                # Empty columns cannot be memory mapped
+                self.columns[name] = np.load(file_path)
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        """Returns a fixed-width column (published, modified, severity, event_kind, ...)."""
+        return self.columns[name]
+
+    def string(self, name, index):
+        """Returns one value of a string column."""
+        offsets = self.columns[name + ".offsets"]
+        blob = self.columns[name + ".blob"]
+        return bytes(blob[offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+    def span(self, name, index):
+        """Returns the [start, end) child range of a nested list column."""
+        lists = self.columns[name + ".lists"]
+        return int(lists[index]), int(lists[index + 1])
+
+    def string_list(self, name, index):
+        """Returns the list of strings stored for one row of a list column."""
+        start, end = self.span(name, index)
+        return [self.string(name, i) for i in range(start, end)]
+
+    def severity(self, index):
+        """Returns the database_specific severity of an advisory."""
+        return SEVERITY_LEVELS[self.columns["severity"][index]]
+
+    def events(self, range_index):
+        """Returns the OSV events of one range as a list of single-key dicts."""
+        start, end = self.span("events", range_index)
+        kinds = self.columns["event_kind"]
+        return [{EVENT_KINDS[kinds[i]]: self.string("event_value", i)} for i in range(start, end)]
+
+    def database_specific(self, index, tree):
+        fields = {
+            "severity": lambda: self.severity(index) or None,
+            "cwe_ids": lambda: self.string_list("cwe_ids", index),
+            "nvd_published_at": lambda: format_date(self.columns["nvd_published_at"][index]),
+            "github_reviewed_at": lambda: format_date(self.columns["github_reviewed_at"][index]),
+        }
+        return {key: build() for key, build in fields.items() if not tree or key in tree}
+
+    def affected(self, index, tree):
+        start, end = self.span("affected", index)
+        affected = []
+        for a in range(start, end):
+            fields = {
+                "package": lambda: {"name": self.string("package", a)},
+                "ranges": lambda: [{"type": self.string("range_type", r), "events": self.events(r)}
+                                   for r in range(*self.span("ranges", a))],
+                "versions": lambda: self.string_list("versions", a),
+            }
+            affected.append({key: build() for key, build in fields.items() if not tree or key in tree})
+        return affected
+
+    def severity_list(self, index):
+        types = self.string_list("severity_type", index)
+        scores = self.string_list("severity_score", index)
+        return [{"type": t, "score": s} for t, s in zip(types, scores)]
+
+    def record(self, index, fields=None):
+        """Rebuilds an OSV-shaped dict holding the stored fields of one advisory.
+
+        fields is an optional projection such as "published, affected.ranges.events"
+        (or its parsed tree); only the columns it names are decoded.
+        """
+        tree = parse_projection(fields) if isinstance(fields, (str, list)) else fields or {}
+        fields = {
+            "id": lambda: self.string("id", index),
+            "summary": lambda: self.string("summary", index),
+            "details": lambda: self.string("details", index),
+            "aliases": lambda: self.string_list("aliases", index),
+            "published": lambda: format_date(self.columns["published"][index]),
+            "modified": lambda: format_date(self.columns["modified"][index]),
+            "database_specific": lambda: self.database_specific(index, tree.get("database_specific")),
+            "affected": lambda: self.affected(index, tree.get("affected")),
+            "severity": lambda: self.severity_list(index),
+        }
+        record = {key: build() for key, build in fields.items() if not tree or key in tree}
+        # Deeper paths (e.g. affected.package.name) are trimmed from the little that was decoded
+        return project(record, tree)
+
+    def records(self, fields=None):
+        """Rebuilds every advisory in store order, decoding only the projected fields."""
+        tree = parse_projection(fields) if isinstance(fields, (str, list)) else fields
+        return [self.record(i, tree) for i in range(self.count)]
+
+    def shard_indices(self, shard):
+        """Returns the indices of the advisories that fall in hash shard (i, N)."""
+        index, num_shards = shard
+        return [i for i in range(self.count) if shard_of(self.string("id", i), num_shards) == index]
+
+
+def open_store(store_path):
+    """Opens an advisory store for reading."""
+    return AdvisoryStore(store_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python advisorystore.py <json folder> <store folder>")
+        sys.exit(1)
+    load_errors = ingest(sys.argv[1], sys.argv[2])
+    for file, error in load_errors:
+        print(f"Error loading file {file}: {error}")
+    print(f"Wrote {len(open_store(sys.argv[2]))} advisories to {sys.argv[2]}")
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+
+from decoding import ProjectedParser
+from loader import list_json_files, parse_files
+from manifest import write_atomic
+from metrics import get_logger
+
+# Kept inside the indexed folder; the leading dot keeps it out of "*.json" listings
+INDEX_FILE = ".alias_index.json"
+INDEX_VERSION = 1
+
+log = get_logger("aliasindex")
+
+
+def read_index(folder):
+    """Reads a folder's index as (per-file alias lists, alias -> file names map), empty if missing or unreadable."""
+    try:
+        with open(os.path.join(folder, INDEX_FILE), "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    if index.get("version") != INDEX_VERSION:
+        return {}, {}
+    return index.get("files") or {}, index.get("aliases") or {}
+
+
+def invert(files):
+    """Builds the alias -> sorted file names map from the per-file alias lists."""
+    inverted = {}
+    for name in sorted(files):
+        for alias in files[name]["aliases"]:
+            inverted.setdefault(alias, []).append(name)
+    return inverted
+
+
+def update_index(folder, workers=None):
+    """Brings a folder's alias index up to date and returns the alias -> file names map.
+
+    Only files that are new or whose size/mtime changed are parsed, and only their
+    id and aliases are decoded. The advisory's own id is indexed as an alias too.
+    """
+    old_files, old_inverted = read_index(folder)
+    files = {}
+    changed = []
+    for path in list_json_files(folder):
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        old = old_files.get(name)
+        if old is not None and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            files[name] = old
+        else:
+            files[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "aliases": []}
+            changed.append(path)
+
+    for path, data, error in parse_files(changed, workers, parser=ProjectedParser("id, aliases")):
+        name = os.path.basename(path)
+        if error is not None or not isinstance(data, dict):
+            log.warning("Error indexing %s: %s", name, error or "Invalid JSON structure")
+            del files[name]  # Retried on the next update
+            continue
+        aliases = list(data.get("aliases") or [])
+        if data.get("id"):
+            aliases.append(data["id"])
+        files[name]["aliases"] = sorted(set(aliases))
+
+    if files == old_files and (old_inverted or not files):
+        # Nothing changed, so the persisted map is still the inversion of the file lists
+        return old_inverted
+    inverted = invert(files)
+    index = {"version": INDEX_VERSION, "files": files, "aliases": inverted}
+    write_atomic(os.path.join(folder, INDEX_FILE), json.dumps(index, sort_keys=True), "w")
+    return inverted
+
+
+def lookup(inverted, aliases):
+    """Matches a batch of aliases against the index, returning {file name: set of matched aliases}."""
+    matches = {}
+    for alias in aliases:
+        for name in inverted.get(alias, ()):
+            matches.setdefault(name, set()).add(alias)
+    return matches
+
+
+def link_or_copy(source_path, target_path):
+    """Hardlinks a file into place, copying only when a link is impossible (e.g. across filesystems)."""
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy(source_path, target_path)
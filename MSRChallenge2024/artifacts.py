@@ -0,0 +1,152 @@
+import sys
+from bisect import bisect_left, bisect_right
+
+from filteredstream import iter_rows, parse_cwe_ids
+from versiondates import maven_version_key as version_key
+
+
+def parse_coordinate(coordinate):
+    """Splits "groupId:artifactId[:packaging[:classifier]]:version" into (groupId, artifactId, version).
+
+    Non-Maven "name:version" coordinates (e.g. google-protobuf:3.22.5) get an empty groupId.
+    """
+    parts = coordinate.split(":")
+    if len(parts) == 2:
+        return "", parts[0], parts[1]
+    if len(parts) < 2:
+        raise ValueError(f"Invalid artifact coordinate: {coordinate}")
+    return parts[0], parts[1], parts[-1]
+
+
+def parse_cwe_numbers(cwe_ids):
+    """Parses "[CWE-502, CWE-611]" (or a list of CWE ids) into a tuple of CWE numbers."""
+    numbers = []
+    for cwe in parse_cwe_ids(cwe_ids):
+        number = cwe.upper().replace("CWE-", "")
+        if number.isdigit():
+            numbers.append(int(number))
+    return tuple(numbers)
+
+
+class Artifact:
+    """One vulnerable artifact row of a filtered export.
+
+    Slotted so a row costs a few pointers, and the repeated strings (groupId,
+    artifactId, severity, CVE) are interned so every row shares one copy.
+    """
+
+    __slots__ = ("group_id", "artifact_id", "version", "severity", "cve", "cwe_ids")
+
+    def __init__(self, group_id, artifact_id, version, severity=None, cve=None, cwe_ids=()):
+        self.group_id = sys.intern(group_id)
+        self.artifact_id = sys.intern(artifact_id)
+        self.version = version
+        self.severity = sys.intern(severity) if severity else None
+        self.cve = sys.intern(cve) if cve else None
+        self.cwe_ids = cwe_ids
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds an Artifact from a {Artifact, Severity, CVE, CWE_IDs} export row."""
+        group_id, artifact_id, version = parse_coordinate(row["Artifact"])
+        return cls(group_id, artifact_id, version, row.get("Severity"), row.get("CVE"),
+                   parse_cwe_numbers(row.get("CWE_IDs")))
+
+    @property
+    def coordinate(self):
+        if not self.group_id:
+            return f"{self.artifact_id}:{self.version}"
+        return f"{self.group_id}:{self.artifact_id}:{self.version}"
+
+    def __repr__(self):
+        return f"Artifact({self.coordinate!r}, {self.cve!r}, {self.severity!r}, cwe_ids={self.cwe_ids!r})"
+
+
+class VersionList:
+    """The vulnerable versions of one groupId:artifactId, kept sorted for binary search."""
+
+    __slots__ = ("keys", "versions", "rows", "pending")
+
+    def __init__(self):
+        self.keys = []
+        self.versions = []
+        self.rows = []
+        self.pending = []
+
+    def add(self, artifact):
+        # Rows are sorted in one go on the next query instead of on every insert
+        self.pending.append(artifact)
+
+    def sort(self):
+        if not self.pending:
+            return
+        by_version = {}
+        for version, rows in zip(self.versions, self.rows):
+            by_version[version] = rows
+        for artifact in self.pending:
+            by_version.setdefault(artifact.version, []).append(artifact)
+        self.pending = []
+        ordered = sorted(by_version, key=version_key)
+        self.keys = [version_key(version) for version in ordered]
+        self.versions = ordered
+        self.rows = [by_version[version] for version in ordered]
+
+
+class ArtifactIndex:
+    """Index from groupId -> artifactId -> sorted vulnerable versions."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, artifact):
+        artifacts = self.groups.setdefault(artifact.group_id, {})
+        artifacts.setdefault(artifact.artifact_id, VersionList()).add(artifact)
+
+    def version_list(self, group_id, artifact_id):
+        version_list = self.groups.get(group_id, {}).get(artifact_id)
+        if version_list is not None:
+            version_list.sort()
+        return version_list
+
+    def group_ids(self):
+        return sorted(self.groups)
+
+    def artifact_ids(self, group_id):
+        return sorted(self.groups.get(group_id, {}))
+
+    def versions(self, group_id, artifact_id):
+        """Returns every vulnerable version of an artifact in version order."""
+        version_list = self.version_list(group_id, artifact_id)
+        return list(version_list.versions) if version_list else []
+
+    def find(self, group_id, artifact_id, version):
+        """Returns the rows recorded for one exact version (binary search)."""
+        version_list = self.version_list(group_id, artifact_id)
+        if version_list is None:
+            return []
+        key = version_key(version)
+        i = bisect_left(version_list.keys, key)
+        if i < len(version_list.keys) and version_list.keys[i] == key:
+            return list(version_list.rows[i])
+        return []
+
+    def versions_between(self, group_id, artifact_id, low=None, high=None):
+        """Returns the vulnerable versions v with low <= v <= high (either bound may be None)."""
+        version_list = self.version_list(group_id, artifact_id)
+        if version_list is None:
+            return []
+        start = bisect_left(version_list.keys, version_key(low)) if low is not None else 0
+        end = bisect_right(version_list.keys, version_key(high)) if high is not None else len(version_list.keys)
+        return version_list.versions[start:end]
+
+
+def build_index(filtered_file):
+    """Streams a filtered export into an ArtifactIndex, returning (index, skipped rows)."""
+    index = ArtifactIndex()
+    skipped_entries = []
+    for row in iter_rows(filtered_file):
+        try:
+            index.add(Artifact.from_row(row))
+        except (KeyError, AttributeError, ValueError) as e:
+            skipped_entries.append((row.get("Artifact"), str(e)))
+    return index, skipped_entries
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import patchtime
+from compare import find_matching_files, load_filtered_data
+from loader import load_json_files
+from main import triage
+from metrics import METRICS, peak_memory_bytes
+from synthetic import write_dataset, write_filtered_data
+
+DEFAULT_SIZES = [1000, 10000]
+BENCHMARKS = ["load", "patch_time", "train", "lda", "compare", "triage"]
+# A benchmark this much slower than the baseline is reported as a regression
+DEFAULT_TOLERANCE = 1.2
+
+
+class Skip(Exception):
+    """Raised by a benchmark that cannot run here (e.g. a missing optional dependency)."""
+
+
+def bench_load(context):
+    data_list, errors = load_json_files(context["folder"], workers=context["workers"])
+    context["data_list"] = data_list
+    return len(data_list)
+
+
+def bench_patch_time(context):
+    patchtime.average_patch_time(context["data_list"])
+    return len(context["data_list"])
+
+
+def bench_train(context):
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        from predictSeverity import load_training_data
+    except (ImportError, LookupError) as e:
+        raise Skip(str(e))
+    texts, labels = load_training_data(context["data_list"])
+    features = TfidfVectorizer(stop_words="english").fit_transform(texts)
+    LogisticRegression(max_iter=1000).fit(features, labels)
+    return len(texts)
+
+
+def bench_lda(context):
+    try:
+        from gensim import corpora, models
+        from LDS import preprocess_text
+    except (ImportError, LookupError) as e:  # LookupError: nltk corpora not downloaded
+        raise Skip(str(e))
+    documents = [f"{data.get('summary', '')} {data.get('details', '')}" for data in context["data_list"]]
+    processed_docs = [preprocess_text(doc) for doc in documents]
+    dictionary = corpora.Dictionary(processed_docs)
+    corpus = [dictionary.doc2bow(doc) for doc in processed_docs]
+    models.LdaModel(corpus, num_topics=10, id2word=dictionary, passes=1)
+    return len(documents)
+
+
+def bench_compare(context):
+    cves = load_filtered_data(context["filtered_data"])
+    find_matching_files(context["folder"], cves, os.path.join(context["workdir"], "matched_files"))
+    return len(cves)
+
+
+def bench_triage(context):
+    # Moves and deletes files, so it runs last
+    triage(context["folder"], workers=context["workers"])
+    return context["size"]
+
+
+BENCHMARK_FUNCTIONS = {name: globals()["bench_" + name] for name in BENCHMARKS}
+
+
+def run_one(name, func, context):
+    """Times one benchmark and returns its result record."""
+    result = {"benchmark": name, "size": context["size"]}
+    start = time.perf_counter()
+    try:
+        with METRICS.stage(f"bench_{name}"):
+            items = func(context)
+    except Skip as e:
+        result.update(status="skipped", reason=str(e))
+        return result
+    except Exception as e:
+        result.update(status="error", reason=f"{type(e).__name__}: {e}")
+        return result
+    seconds = time.perf_counter() - start
+    result.update(status="ok", seconds=seconds, items=items,
+                  items_per_second=items / seconds if seconds > 0 else None,
+                  peak_memory_bytes=peak_memory_bytes())
+    return result
+
+
+def run_size(size, benchmarks, seed=0, workers=None, workdir=None, keep=False):
+    """Generates a dataset of `size` advisories and runs the benchmarks over it."""
+    root = tempfile.mkdtemp(prefix=f"msr-bench-{size}-", dir=workdir)
+    context = {"size": size, "workers": workers, "workdir": root, "folder": os.path.join(root, "advisories"),
+               "filtered_data": os.path.join(root, "Filtered Data.json"), "data_list": []}
+    results = []
+    try:
+        start = time.perf_counter()
+        aliases = write_dataset(context["folder"], size, seed, workers)
+        write_filtered_data(context["filtered_data"], aliases[::2], seed)
+        results.append({"benchmark": "generate", "size": size, "status": "ok",
+                        "seconds": time.perf_counter() - start, "items": size})
+        for name in benchmarks:
+            result = run_one(name, BENCHMARK_FUNCTIONS[name], context)
+            results.append(result)
+            print(format_result(result), file=sys.stderr)
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def format_result(result):
+    if result["status"] != "ok":
+        return f"{result['benchmark']:>10} {result['size']:>9}: {result['status']} ({result.get('reason')})"
+    rate = result.get("items_per_second") or 0
+    return f"{result['benchmark']:>10} {result['size']:>9}: {result['seconds']:9.3f}s {rate:12.0f} items/s"
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Lists (benchmark, size, baseline s, current s, ratio) for every benchmark slower than tolerance x."""
+    def timings(report):
+        return {(r["benchmark"], r["size"]): r["seconds"] for r in report["results"] if r["status"] == "ok"}
+
+    old, new = timings(baseline), timings(current)
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] > 0 else float("inf")
+        if ratio > tolerance:
+            regressions.append((key[0], key[1], old[key], new[key], ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analysis scripts on synthetic advisories.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated dataset sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="comma-separated subset to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--workdir", default=None, help="where the datasets are generated (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated datasets")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in BENCHMARK_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+    # Keep the canonical order so triage always runs last
+    selected = [name for name in BENCHMARKS if name in selected]
+
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "workers": args.workers,
+        "results": [],
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        report["results"].extend(run_size(size, selected, args.seed, args.workers, args.workdir, args.keep))
+    report["metrics"] = METRICS.to_dict()
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare_results(json.load(f), report, args.tolerance)
+        for benchmark, size, old, new, ratio in regressions:
+            print(f"REGRESSION {benchmark} @ {size}: {old:.3f}s -> {new:.3f}s ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
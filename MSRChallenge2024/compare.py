@@ -1,38 +1,34 @@
 import os
-import json
-import shutil
+
+from aliasindex import link_or_copy, lookup, update_index
+from filteredstream import iter_rows
+from metrics import METRICS, get_logger
+
+log = get_logger('compare')
 
 # Function to load CVEs from the Filtered Data.json
 def load_filtered_data(filtered_file):
-    with open(filtered_file, 'r') as f:
-        data = json.load(f)
-    # Extract CVEs from the filtered data
-    cve_list = {entry["CVE"] for entry in data}  # Use set for fast lookup
+    # Stream the rows and keep only the CVE column instead of loading the whole array
+    cve_list = {row["CVE"] for row in iter_rows(filtered_file, columns=["CVE"])}  # Use set for fast lookup
     return cve_list
 
-# Function to load processed data .json files and find matches
+# Function to match the CVEs against the processed data .json files and link the matches
 def find_matching_files(processed_folder, cve_list, output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    # Iterate over all json files in the processed data folder
-    for file_name in os.listdir(processed_folder):
-        if file_name.endswith(".json"):
-            file_path = os.path.join(processed_folder, file_name)
-
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-
-            # Checks if any aliases (CVE) match the filtered data
-            aliases = {alias for alias in data.get("aliases", [])}
+    # Update the persisted alias index (only new or changed files are parsed)
+    inverted = update_index(processed_folder)
 
-            # Find intersection of CVEs between filtered data and aliases in processed file
-            matching_cves = cve_list.intersection(aliases)
+    # Look up every CVE in the index instead of scanning the files
+    matches = lookup(inverted, cve_list)
 
-            if matching_cves:
-                print(f"Match found in {file_name}: {matching_cves}")
-                # If there's a match, copy the file to the output folder
-                shutil.copy(file_path, os.path.join(output_folder, file_name))
+    for file_name in sorted(matches):
+        log.info("Match found in %s: %s", file_name, matches[file_name])
+        # If there's a match, hardlink the file into the output folder
+        link_or_copy(os.path.join(processed_folder, file_name), os.path.join(output_folder, file_name))
+    METRICS.count("alias_matches_total", len(matches))
+    return matches
 
 # Main function to orchestrate the process
 def main(filtered_file, processed_folder, output_folder):
@@ -1,44 +1,42 @@
 import os
-import json
 from datetime import datetime
 
+from loader import list_json_files, parse_files
+from streamstats import PatchTimeStats, format_summary
+
 # Path to the directory containing JSON files
 directory_path = "/Users/jaydencruz/PycharmProjects/MSRChallenge/Duaa'sFiles"
 
 
 def calculate_average_patch_time(directory):
-    patch_durations = []
+    # Streamed into constant-memory stats instead of a list of every duration
+    stats = PatchTimeStats()
     processed_files = 0  # To count successfully processed files
 
-    # Iterate over all files in the directory
-    for file_name in os.listdir(directory):
-        file_path = os.path.join(directory, file_name)
-
-        # Process only JSON files
-        if file_name.endswith(".json"):
-            try:
-                with open(file_path, 'r') as file:
-                    data = json.load(file)
+    # Parse all JSON files in the directory in parallel
+    for file_path, data, error in parse_files(list_json_files(directory)):
+        file_name = os.path.basename(file_path)
+        if error is not None:
+            print(f"Error processing file {file_path}: {error}")
+            continue
 
-                    # Handle root JSON structure: either list or dictionary
-                    if isinstance(data, list):
-                        # Process each item in the list
-                        for item in data:
-                            patch_durations.extend(process_vulnerability(item))
-                    elif isinstance(data, dict):
-                        # Process single dictionary
-                        patch_durations.extend(process_vulnerability(data))
-                    else:
-                        print(f"Unknown JSON structure in {file_name}")
+        # Handle root JSON structure: either list or dictionary
+        if isinstance(data, list):
+            # Process each item in the list
+            for item in data:
+                stats.update(process_vulnerability(item))
+        elif isinstance(data, dict):
+            # Process single dictionary
+            stats.update(process_vulnerability(data))
+        else:
+            print(f"Unknown JSON structure in {file_name}")
 
-                    processed_files += 1
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
+        processed_files += 1
 
     # Calculate the average patch time
-    if patch_durations:
-        average_time = sum(patch_durations) / len(patch_durations)
-        print(f"Average time to patch vulnerabilities: {average_time:.2f} days")
+    if stats.count:
+        print(f"Average time to patch vulnerabilities: {stats.moments.mean:.2f} days")
+        print(f"Distribution: {format_summary(stats.summary(), 'days')}")
     else:
         print("No valid data found to compute the average patch time.")
     print(f"Processed {processed_files} files with HIGH or CRITICAL severity.")
@@ -65,5 +63,6 @@ def process_vulnerability(vuln_data):
 
 
 # Call the function
-calculate_average_patch_time(directory_path)
+if __name__ == "__main__":
+    calculate_average_patch_time(directory_path)
 
@@ -0,0 +1,179 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Values of every base metric from least to most severe; a metric column holds the rank scaled to 0..1
+METRIC_VALUES = {
+    "AV": "PLAN",  # physical, local, adjacent, network
+    "AC": "HL",
+    "AT": "PN",  # v4 attack requirements
+    "PR": "HLN",
+    "UI": "RN",  # v4 has active, passive, none instead
+    "S": "UC",
+    "C": "NLH", "I": "NLH", "A": "NLH",
+    "SC": "NLH", "SI": "NLH", "SA": "NLH",  # v4 impact on subsequent systems
+}
+V4_UI_VALUES = "APN"
+V3_METRICS = ["AV", "AC", "PR", "UI", "S", "C", "I", "A"]
+V4_METRICS = ["AV", "AC", "AT", "PR", "UI", "VC", "VI", "VA", "SC", "SI", "SA"]
+# v4's vulnerable-system impacts fill the same columns as v3's C/I/A
+V4_COLUMN = {"VC": "C", "VI": "I", "VA": "A"}
+
+COLUMNS = ["version", "base_score", "AV", "AC", "AT", "PR", "UI", "S", "C", "I", "A", "SC", "SI", "SA"]
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+
+# CVSS v3.x specification weights
+WEIGHTS = {
+    "AV": {"N": 0.85, "A": 0.62, "L": 0.55, "P": 0.2},
+    "AC": {"L": 0.77, "H": 0.44},
+    "UI": {"N": 0.85, "R": 0.62},
+    "CIA": {"H": 0.56, "L": 0.22, "N": 0.0},
+}
+PR_WEIGHTS = {"U": {"N": 0.85, "L": 0.62, "H": 0.27}, "C": {"N": 0.85, "L": 0.68, "H": 0.5}}
+
+# Distinct vectors remembered; the advisory corpora only have a few hundred
+CACHE_SIZE = 1 << 14
+
+SEVERITY_RATINGS = [(0.0, "NONE"), (3.9, "LOW"), (6.9, "MEDIUM"), (8.9, "HIGH"), (10.0, "CRITICAL")]
+
+
+def metric_values(version, name):
+    """The values a base metric can take, from least to most severe."""
+    if version == "4.0" and name == "UI":
+        return V4_UI_VALUES
+    return METRIC_VALUES[V4_COLUMN.get(name, name)]
+
+
+def parse_vector(vector):
+    """Splits "CVSS:3.1/AV:N/..." into (version, {metric: value}); raises ValueError if it is malformed.
+
+    Only the base metrics are checked and returned; temporal, threat and
+    environmental metrics are accepted and ignored.
+    """
+    prefix, _, body = vector.strip().partition("/")
+    if not prefix.startswith("CVSS:") or not body:
+        raise ValueError(f"not a CVSS vector: {vector!r}")
+    version = prefix[5:]
+    if version in ("3.0", "3.1"):
+        required = V3_METRICS
+    elif version == "4.0":
+        required = V4_METRICS
+    else:
+        raise ValueError(f"unsupported CVSS version {version!r}")
+
+    metrics = {}
+    for part in body.split("/"):
+        name, sep, value = part.partition(":")
+        if not sep or name in metrics:
+            raise ValueError(f"malformed metric {part!r} in {vector!r}")
+        metrics[name] = value
+    base = {}
+    for name in required:
+        value = metrics.get(name)
+        allowed = metric_values(version, name)
+        if value is None or len(value) != 1 or value not in allowed:
+            raise ValueError(f"missing or invalid {name} in {vector!r}")
+        base[name] = value
+    return version, base
+
+
+def roundup(value, version="3.1"):
+    """Rounds up to one decimal the way the v3.0 and v3.1 specifications do."""
+    if version == "3.0":
+        return math.ceil(value * 10) / 10
+    # v3.1 works on integers to avoid floating point results like 4.000001 rounding up to 4.1
+    scaled = round(value * 100000)
+    if scaled % 10000 == 0:
+        return scaled / 100000.0
+    return (math.floor(scaled / 10000) + 1) / 10.0
+
+
+def v3_base_score(base, version="3.1"):
+    """Base score of a parsed v3.x vector."""
+    changed = base["S"] == "C"
+    iss = 1 - ((1 - WEIGHTS["CIA"][base["C"]]) * (1 - WEIGHTS["CIA"][base["I"]]) * (1 - WEIGHTS["CIA"][base["A"]]))
+    if changed:
+        impact = 7.52 * (iss - 0.029) - 3.25 * (iss - 0.02) ** 15
+    else:
+        impact = 6.42 * iss
+    if impact <= 0:
+        return 0.0
+    exploitability = (8.22 * WEIGHTS["AV"][base["AV"]] * WEIGHTS["AC"][base["AC"]]
+                      * PR_WEIGHTS[base["S"]][base["PR"]] * WEIGHTS["UI"][base["UI"]])
+    total = 1.08 * (impact + exploitability) if changed else impact + exploitability
+    return roundup(min(total, 10), version)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def vector_row(vector):
+    """Numeric columns (see COLUMNS) of one vector; all NaN if it cannot be parsed.
+
+    The base score is only computed for v3.x: v4 scores come from the
+    specification's macrovector lookup table, so v4 vectors only get their
+    metric columns.
+    """
+    row = [math.nan] * len(COLUMNS)
+    if not isinstance(vector, str):
+        return tuple(row)
+    try:
+        version, base = parse_vector(vector)
+    except ValueError:
+        return tuple(row)
+    row[COLUMN_INDEX["version"]] = float(version)
+    if version != "4.0":
+        row[COLUMN_INDEX["base_score"]] = v3_base_score(base, version)
+    for name, value in base.items():
+        allowed = metric_values(version, name)
+        row[COLUMN_INDEX[V4_COLUMN.get(name, name)]] = allowed.index(value) / (len(allowed) - 1)
+    return tuple(row)
+
+
+def vector_columns(vectors):
+    """Parses a column of vector strings at once into an (n, len(COLUMNS)) float array.
+
+    Each distinct vector is parsed once (and cached across calls), then the
+    rows are gathered for the whole column. Missing or malformed vectors give
+    rows of NaN, so `np.isnan(table[:, 0])` marks them.
+    """
+    codes = {}  # distinct vector -> row of the table
+    inverse = np.fromiter((codes.setdefault(vector, len(codes)) for vector in vectors), dtype=np.intp)
+    table = np.array([vector_row(vector) for vector in codes], dtype=float).reshape(-1, len(COLUMNS))
+    return table[inverse]
+
+
+def base_scores(vectors):
+    """Base score of every vector in a column (NaN for v4, missing or malformed vectors)."""
+    return vector_columns(vectors)[:, COLUMN_INDEX["base_score"]]
+
+
+def severity_rating(score):
+    """The qualitative rating (NONE, LOW, MEDIUM, HIGH, CRITICAL) of a base score."""
+    for upper, rating in SEVERITY_RATINGS:
+        if score <= upper:
+            return rating
+    return None
+
+
+def advisory_vector(entry, types=("CVSS_V3", "CVSS_V4")):
+    """The CVSS vector of an OSV advisory, preferring the types in order; None if it has none."""
+    vectors = {}
+    for severity_info in entry.get("severity") or []:
+        if isinstance(severity_info, dict):
+            vectors.setdefault(severity_info.get("type"), severity_info.get("score"))
+    for kind in types:
+        if vectors.get(kind):
+            return vectors[kind]
+    return None
+
+
+def advisory_columns(data_list, types=("CVSS_V3", "CVSS_V4")):
+    """Numeric CVSS columns of a list of advisories, one row per advisory."""
+    return vector_columns([advisory_vector(entry, types) for entry in data_list])
+
+
+def advisory_features(data_list, types=("CVSS_V3", "CVSS_V4")):
+    """CVSS columns of advisories as model features: no version, base score scaled to 0..1 and NaN as 0."""
+    features = advisory_columns(data_list, types)[:, 1:]
+    features[:, 0] /= 10
+    return np.nan_to_num(features, nan=0.0)
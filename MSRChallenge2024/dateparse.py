@@ -0,0 +1,93 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    from dateutil.parser import parse as dateutil_parse
+except ImportError:  # Only needed for the rare strings that are neither ISO dates nor versions
+    dateutil_parse = None
+
+from metrics import METRICS, get_logger
+
+DATE = "date"
+VERSION = "version"
+UNKNOWN = "unknown"
+
+# 2022-04-22, 2022-04-22T00:00:36Z, 2023-11-08T04:07:31.376398Z, 2022-04-22 00:00:36+02:00
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,9})?)?)?(?:Z|[+-]\d{2}:?\d{2})?$")
+
+# The patterns convert_to_datetime used to report, checked first so the log keeps its wording
+VERSION_PATTERNS = [
+    (re.compile(r"^\d+(\.\d+)+(\.Final)?$"), "Unrecognized date format (likely a version)"),
+    (re.compile(r"^\d+\.\d+\.\d+\.\w+\d+$"), "Date format with version suffix"),
+    (re.compile(r"^\d+\.\d+\.\d+-rc-\d+$"), "Date format with release candidate"),
+]
+# Anything else shaped like a version: digits first, then dot/dash/underscore/plus separated parts
+# (9.4.6.v20170531, 1.0.0-RC10, 2.5.33, v1.2, 20170531)
+GENERIC_VERSION = re.compile(r"^[vV]?\d+(?:[._\-+]?[A-Za-z0-9]+)*$")
+
+# Distinct strings remembered by to_datetime; the corpora only have a few thousand
+CACHE_SIZE = 1 << 16
+
+log = get_logger("dateparse")
+
+
+def classify(text):
+    """Decides whether a string is an ISO date, a version or unknown, with regexes only."""
+    if ISO_DATE.match(text):
+        return DATE
+    if GENERIC_VERSION.match(text):
+        return VERSION
+    return UNKNOWN
+
+
+def version_reason(text):
+    for pattern, reason in VERSION_PATTERNS:
+        if pattern.match(text):
+            return reason
+    return "Version string"
+
+
+def parse_iso(text):
+    """Parses an ISO 8601 date or timestamp into an offset-naive datetime (the offset is dropped)."""
+    text = text.replace(" ", "T", 1)
+    if text.endswith("Z"):
+        text = text[:-1]
+    # fromisoformat only takes up to microseconds
+    if "." in text:
+        head, _, tail = text.partition(".")
+        digits = len(tail) - len(tail.lstrip("0123456789"))
+        text = head + "." + tail[:min(digits, 6)].ljust(6, "0") + tail[digits:]
+    return datetime.fromisoformat(text).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_datetime(text):
+    """Converts a string to an offset-naive datetime, or None if it is a version or not a date.
+
+    ISO dates take the fast path and versions are rejected before any parsing;
+    only strings neither pattern recognises reach dateutil's fuzzy parser.
+    Results are memoised, so every distinct string is classified once.
+    """
+    if not isinstance(text, str):
+        return None
+    kind = classify(text)
+    # Counted once per distinct string, as repeats are answered by the cache
+    METRICS.count("distinct_date_strings_total", kind=kind)
+    if kind == DATE:
+        try:
+            return parse_iso(text)
+        except ValueError:
+            log.debug("Invalid ISO date: %s. Skipping.", text)
+            return None
+    if kind == VERSION:
+        log.debug("%s: %s. Skipping.", version_reason(text), text)
+        return None
+
+    if dateutil_parse is not None:
+        try:
+            return dateutil_parse(text, fuzzy=True).replace(tzinfo=None)
+        except (ValueError, OverflowError):
+            pass
+    log.warning("Unrecognized date format: %s. Skipping.", text)
+    return None
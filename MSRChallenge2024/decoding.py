@@ -0,0 +1,61 @@
+import json
+
+# orjson decodes several times faster than the stdlib and accepts the same input,
+# so use it when it is installed and fall back to json otherwise.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content):
+    """Decodes JSON text or bytes with the fastest available backend."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def parse_projection(fields):
+    """Turns "published, affected.ranges.events" into a nested dict of wanted keys.
+
+    An empty dict marks a path that is kept whole.
+    """
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    tree = {}
+    for field in fields:
+        node = tree
+        for key in field.strip().split("."):
+            node = node.setdefault(key, {})
+    return tree
+
+
+def project(data, tree):
+    """Keeps only the projected paths of a decoded value; lists are walked element by element."""
+    if not tree:
+        return data
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project(data[key], subtree) for key, subtree in tree.items() if key in data}
+
+
+class ProjectedParser:
+    """File parser for loader.parse_files that only keeps the projected fields.
+
+    The projection runs inside the worker process, so the large fields that are
+    not wanted (details, references, versions, ...) are dropped before the
+    record is sent back and never kept in the main process.
+    """
+
+    def __init__(self, fields):
+        self.tree = parse_projection(fields)
+
+    def __call__(self, path):
+        # Imported here because loader imports this module for loads()
+        from loader import read_bytes
+        try:
+            return path, project(loads(read_bytes(path)), self.tree), None
+        except Exception as e:
+            return path, None, str(e)
@@ -1,134 +1,56 @@
-import json
-import glob
-from datetime import datetime
-
-
-def convert_to_datetime(timestamp):
-    """Converts ISO timestamp to a datetime object."""
-    try:
-        return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
-    except ValueError:
-        try:
-            return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ")
-        except ValueError:
-            return None
-
-
-def map_version_to_date(version, dynamic_mapping):
-    """Maps version numbers to release dates."""
-    version_date_mapping = {
-        "2.4.0": "2020-05-01T00:00:00Z",
-        "4.3.1": "2021-08-01T00:00:00Z",
-        "7.0.1": "2022-01-01T00:00:00Z",
-    }
-    return version_date_mapping.get(version) or dynamic_mapping.get(version)
-
-
-def calculate_average_patch_time(data_list, dynamic_mapping):
-    """Calculates average patch time."""
-    patch_times = []
-    skipped_entries = []
-
-    for entry in data_list:
-        published = entry.get("published")
-        if not published:
-            skipped_entries.append((entry.get("id"), "Published date not found"))
-            continue
-
-        fixed = None
-        affected = entry.get("affected", [])
-        for item in affected:
-            ranges = item.get("ranges", [])
-            for range_info in ranges:
-                for event in range_info.get("events", []):
-                    if "fixed" in event:
-                        fixed = event["fixed"]
-                        break
-                if fixed:
-                    break
-            if fixed:
-                break
-
-        if not fixed:
-            skipped_entries.append((entry.get("id"), "Fixed date not found"))
-            continue
-
-        fixed_date = convert_to_datetime(fixed)
-
-
-        if not fixed_date:
-            fixed_date_str = map_version_to_date(fixed, dynamic_mapping)
-            if not fixed_date_str:
-                skipped_entries.append((entry.get("id"), f"No date mapping for version {fixed}"))
-                continue
-            fixed_date = convert_to_datetime(fixed_date_str)
-
-        published_date = convert_to_datetime(published)
-        if not published_date:
-            skipped_entries.append((entry.get("id"), "Invalid published date"))
-            continue
-
-        if fixed_date < published_date:
-            skipped_entries.append((entry.get("id"), "Fixed date is earlier than published date"))
-            continue
-
-        patch_time = (fixed_date - published_date).total_seconds()/60
-        print(fixed_date, published_date)
-        patch_times.append(patch_time)
-        print(patch_time)
-
-    if patch_times:
-        average_patch_time = sum(patch_times) / len(patch_times)
-        return average_patch_time, skipped_entries
-    else:
-        return 0, skipped_entries
-
-
-def build_dynamic_mapping(data_list):
-    """Dynamically generates mappings for versions."""
-    mapping = {}
-    for entry in data_list:
-        published = entry.get("published")
-        if published:
-            affected = entry.get("affected", [])
-            for item in affected:
-                ranges = item.get("ranges", [])
-                for range_info in ranges:
-                    for event in range_info.get("events", []):
-                        if "fixed" in event:
-                            mapping[event["fixed"]] = published
-    return mapping
-
-
-def load_json_files(file_pattern):
-    """Loads JSON files into a list."""
-    data_list = []
-    files = glob.glob(file_pattern)
-    print(f"Files found: {files}")
-
-    for file in files:
-        try:
-            with open(file, "r") as f:
-                data = json.load(f)
-                data_list.append(data)
-        except Exception as e:
-            print(f"Error loading file {file}: {e}")
-    return data_list
-
-
-# Define file pattern and load files
-file_pattern = "/Users/jaydencruz/PycharmProjects/MSRChallenge/Duaa'sFiles/*.json"
-data_list = load_json_files(file_pattern)
-
-# Build dynamic mapping and calculate average patch time
-dynamic_mapping = build_dynamic_mapping(data_list)
-average_patch_time, skipped_entries = calculate_average_patch_time(data_list, dynamic_mapping)
-
-# Log skipped entries
-if skipped_entries:
-    print("\nSkipped Entries:")
-    for entry_id, reason in skipped_entries:
-        print(f"Entry ID: {entry_id}, Reason: {reason}")
-
-# Print average patch time
-print(f"\nAverage Patch Time: {average_patch_time:.2f} minutes")
+import argparse
+
+import patchtime
+from loader import load_json_files
+from patchtime import build_dynamic_mapping
+from rejectlog import DEFAULT_REJECT_LOG, RejectLog
+from shardmerge import add_shard_arguments, write_shard
+from streamstats import format_summary
+from versiondates import add_resolver_arguments, resolver_from_args
+
+# The only advisory fields the patch time calculation reads
+PATCH_TIME_FIELDS = "id, published, affected.package.name, affected.ranges.events"
+
+
+def calculate_patch_time_stats(data_list, dynamic_mapping, reject_log=None, resolver=None):
+    """Streams the patch times in minutes into PatchTimeStats; returns (stats, skipped entries)."""
+    return patchtime.patch_time_stats(data_list, dynamic_mapping, unit="minutes", reject_log=reject_log,
+                                      resolver=resolver)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Average patch time of a folder of advisories.")
+    parser.add_argument("source", nargs="?",
+                        default="/Users/jaydencruz/PycharmProjects/MSRChallenge/Duaa'sFiles/*.json",
+                        help="Folder, glob, zip or advisory store to read")
+    add_resolver_arguments(parser)
+    add_shard_arguments(parser, "duaatimetwo-shard")
+    args = parser.parse_args()
+    # Resolves fixed versions to release dates when release data is given
+    resolver = resolver_from_args(args)
+
+    # Load files
+    data_list, load_errors = load_json_files(args.source, incremental=True, fields=PATCH_TIME_FIELDS,
+                                             shard=args.shard)
+    for file, error in load_errors:
+        print(f"Error loading file {file}: {error}")
+
+    # Build dynamic mapping and stream the patch times into their statistics
+    dynamic_mapping = build_dynamic_mapping(data_list)
+    with RejectLog(DEFAULT_REJECT_LOG, source="duaatimetwo") as reject_log:
+        stats, _ = calculate_patch_time_stats(data_list, dynamic_mapping, reject_log, resolver)
+    # A shard's results go to files that shardmerge.py combines into those of the whole dataset
+    if args.shard:
+        write_shard(args.shard_output, args.shard, data_list, stats, "minutes", resolver=resolver)
+    if resolver:
+        resolver.save_cache()
+
+    # Summarise skipped entries (the details are in the reject log)
+    if reject_log.total:
+        print(f"\nSkipped Entries (see {DEFAULT_REJECT_LOG}):")
+        print(reject_log.summary())
+
+    # Print average patch time and its distribution
+    summary = stats.summary()
+    print(f"\nAverage Patch Time: {summary.get('mean', 0):.2f} minutes")
+    print(f"Distribution: {format_summary(summary, 'minutes')}")
@@ -0,0 +1,70 @@
+import json
+import re
+from collections import Counter
+
+# Characters read from the file at a time. Memory stays around one chunk plus one row,
+# however many rows the export holds.
+DEFAULT_READ_SIZE = 1 << 20
+
+# Whitespace and the commas between array items
+SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_rows(filtered_file, columns=None, read_size=DEFAULT_READ_SIZE):
+    """Yields the rows of a Filtered Data.json array one at a time, optionally keeping only some columns."""
+    decoder = json.JSONDecoder()
+    with open(filtered_file, "r", encoding="utf-8") as f:
+        buffer = f.read(read_size)
+        position = SEPARATORS.match(buffer).end()
+        if buffer[position:position + 1] != "[":
+            raise ValueError(f"{filtered_file} does not contain a JSON array")
+        position += 1
+        at_end = False
+
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if buffer[position:position + 1] == "]":
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The row continues past the buffer: keep its start and read more
+                if at_end:
+                    raise
+                chunk = f.read(read_size)
+                at_end = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            if columns is not None:
+                row = {column: row.get(column) for column in columns}
+            yield row
+
+
+def parse_cwe_ids(cwe_ids):
+    """Parses the stringified CWE list ("[CWE-502, CWE-611]") into a list of CWE ids."""
+    if isinstance(cwe_ids, list):
+        return cwe_ids
+    return [cwe.strip() for cwe in (cwe_ids or "").strip("[]").split(",") if cwe.strip()]
+
+
+def scan_filtered_data(filtered_file, cves=True, artifacts=False, cwe_counts=False):
+    """Builds the requested CVE set, artifact set and CWE counts in a single streaming pass."""
+    columns = [name for name, wanted in [("CVE", cves), ("Artifact", artifacts), ("CWE_IDs", cwe_counts)] if wanted]
+    result = {}
+    if cves:
+        result["cves"] = set()
+    if artifacts:
+        result["artifacts"] = set()
+    if cwe_counts:
+        result["cwe_counts"] = Counter()
+
+    for row in iter_rows(filtered_file, columns):
+        if cves and row["CVE"]:
+            result["cves"].add(row["CVE"])
+        if artifacts and row["Artifact"]:
+            result["artifacts"].add(row["Artifact"])
+        if cwe_counts:
+            result["cwe_counts"].update(parse_cwe_ids(row["CWE_IDs"]))
+    return result
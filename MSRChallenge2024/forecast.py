@@ -0,0 +1,312 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from manifest import write_atomic
+from patchtime import UNITS
+from rollupcube import CUBE_FIELDS, RollupCube
+
+MODELS = ["naive", "ses", "holt", "ar"]
+# Smoothing parameters tried for every series at once; the one with the lowest one-step error wins
+ALPHAS = np.linspace(0.05, 0.95, 19)
+BETAS = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+AR_ORDER = 3
+# Regularises the AR fit of short or flat series
+AR_RIDGE = 1e-3
+# Series with fewer observed months are not forecast
+MIN_POINTS = 6
+
+
+def series_matrix(cube, by="group_id", min_points=MIN_POINTS, keys=None, months=None):
+    """Monthly mean patch time per value of one cube dimension.
+
+    Returns (keys, months, matrix) where matrix[i, t] is the mean of keys[i] in
+    months[t] and NaN for months without advisories. Pass the keys and months of
+    another matrix to get one aligned with it.
+    """
+    rollup = cube.query(by=[by, "month"])
+    if months is None:
+        observed = sorted({month for _, month in rollup})
+        if not observed:
+            return [], [], np.empty((0, 0))
+        span = np.arange(np.datetime64(observed[0], "M"), np.datetime64(observed[-1], "M") + 1)
+        months = [str(month) for month in span]
+    if keys is None:
+        keys = sorted({key for key, _ in rollup})
+    row = {key: i for i, key in enumerate(keys)}
+    column = {month: t for t, month in enumerate(months)}
+    matrix = np.full((len(keys), len(months)), np.nan)
+    for (key, month), measures in rollup.items():
+        if key in row and month in column:
+            matrix[row[key], column[month]] = measures["mean"]
+    if min_points:
+        kept = np.flatnonzero(np.sum(~np.isnan(matrix), axis=1) >= min_points)
+        keys, matrix = [keys[i] for i in kept], matrix[kept]
+    return keys, months, matrix
+
+
+def forward_fill(matrix):
+    """Carries the last observed value of every row over its gaps (leading gaps stay NaN)."""
+    index = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return np.take_along_axis(matrix, index, axis=1)
+
+
+def forecast_naive(matrix, horizon):
+    """Repeats the last observed value of every series."""
+    last = forward_fill(matrix)[:, -1:] if matrix.shape[1] else np.full((len(matrix), 1), np.nan)
+    return np.repeat(last, horizon, axis=1)
+
+
+def smooth(matrix, alphas, betas):
+    """Runs Holt's linear exponential smoothing over every series for every (alpha, beta) at once.
+
+    Loops over months only; series and parameters are vectorised. Each series
+    starts at its first observed month. A missing month is not an error: the
+    level moves along the trend and the trend is kept. Returns the final level
+    and trend and the one-step squared error sum, each of shape (series, parameters).
+    """
+    series, months = matrix.shape
+    observed = ~np.isnan(matrix)
+    first = np.where(observed.any(axis=1), observed.argmax(axis=1), months)
+    start = matrix[np.arange(series), np.minimum(first, months - 1)] if months else np.zeros(series)
+    # The first observation only sets the level, so it is not scored
+    observed[np.arange(series)[first < months], first[first < months]] = False
+    values = np.where(observed, matrix, 0.0)
+    mask = observed.astype(float)
+
+    gain = alphas[None, :]
+    trend_gain = (alphas * betas)[None, :]
+    level = np.repeat(np.nan_to_num(start)[:, None], len(alphas), axis=1)
+    trend = np.zeros_like(level)
+    sse = np.zeros_like(level)
+    for t in range(months):
+        # Error-correction form of Holt's method; a missing month has no error, so nothing but the level moves
+        error = (values[:, t:t + 1] - level - trend) * mask[:, t:t + 1]
+        sse += error * error
+        level += trend + gain * error
+        trend += trend_gain * error
+    empty = first == months
+    level[empty] = np.nan
+    return level, trend, sse
+
+
+def forecast_smoothing(matrix, horizon, trend=False):
+    """Exponential smoothing forecasts, with Holt's trend if trend is set; parameters are fit per series."""
+    if trend:
+        alphas, betas = (grid.ravel() for grid in np.meshgrid(ALPHAS, BETAS))
+    else:
+        alphas, betas = ALPHAS, np.zeros_like(ALPHAS)
+    level, slope, sse = smooth(matrix, alphas, betas)
+    best = np.argmin(sse, axis=1)[:, None]
+    level = np.take_along_axis(level, best, axis=1)
+    slope = np.take_along_axis(slope, best, axis=1)
+    return level + slope * np.arange(1, horizon + 1)
+
+
+def forecast_ses(matrix, horizon):
+    return forecast_smoothing(matrix, horizon)
+
+
+def forecast_holt(matrix, horizon):
+    return forecast_smoothing(matrix, horizon, trend=True)
+
+
+def forecast_ar(matrix, horizon, order=AR_ORDER):
+    """ARIMA(order, 1, 0)-style forecasts: an AR model with intercept on the monthly changes.
+
+    Gaps are filled with the last observed value first. Every series gets its
+    own least-squares fit, solved for all series at once from batched normal
+    equations.
+    """
+    filled = forward_fill(matrix)
+    changes = np.diff(filled, axis=1)
+    series, steps = changes.shape
+    if steps <= order:
+        return forecast_naive(matrix, horizon)
+    # Row j of the design holds the `order` changes before change j + order, plus the intercept
+    lags = np.lib.stride_tricks.sliding_window_view(changes, order, axis=1)[:, :-1]
+    design = np.concatenate([lags, np.ones(lags.shape[:2] + (1,))], axis=2)
+    target = changes[:, order:]
+    usable = ~(np.isnan(target) | np.isnan(lags).any(axis=2))
+    design = np.where(usable[..., None], design, 0.0)
+    target = np.where(usable, target, 0.0)
+    gram = np.einsum("snp,snq->spq", design, design) + AR_RIDGE * np.eye(order + 1)
+    coefficients = np.linalg.solve(gram, np.einsum("snp,sn->sp", design, target)[..., None])[..., 0]
+
+    history = np.nan_to_num(changes[:, -order:])
+    level = filled[:, -1]
+    forecasts = np.empty((series, horizon))
+    for h in range(horizon):
+        change = np.einsum("sp,sp->s", history, coefficients[:, :order]) + coefficients[:, order]
+        level = level + change
+        forecasts[:, h] = level
+        history = np.concatenate([history[:, 1:], change[:, None]], axis=1)
+    # Series with too little history to fit fall back to their last value
+    too_short = usable.sum(axis=1) <= order + 1
+    forecasts[too_short] = forecast_naive(matrix[too_short], horizon)
+    return forecasts
+
+
+FORECASTERS = {"naive": forecast_naive, "ses": forecast_ses, "holt": forecast_holt, "ar": forecast_ar}
+
+
+def backtest_origins(months, horizon=3, folds=6, min_points=MIN_POINTS):
+    """The month indices the backtest forecasts from, oldest first."""
+    return range(max(min_points, months - folds - horizon + 1), months - horizon + 1)
+
+
+def backtest(matrix, horizon=3, folds=6, models=MODELS, min_points=MIN_POINTS, baselines=None):
+    """Rolling-origin backtest of the models over the last `folds` forecast origins.
+
+    At every origin each model is fit on the months before it and scored on the
+    next `horizon` months; only series with min_points observed months before
+    the origin count. baselines maps a name to a prediction matrix of the same
+    shape (e.g. the LSTM's monthly means), scored on exactly the same cells;
+    a baseline must not have seen the months after the earliest origin.
+    Returns {name: {"mae", "rmse", "points", "seconds"}}.
+    """
+    errors = {name: [] for name in list(models) + list(baselines or {})}
+    seconds = dict.fromkeys(errors, 0.0)
+    for origin in backtest_origins(matrix.shape[1], horizon, folds, min_points):
+        train = matrix[:, :origin]
+        actual = matrix[:, origin:origin + horizon]
+        rows = np.flatnonzero(np.sum(~np.isnan(train), axis=1) >= min_points)
+        if len(rows) == 0:
+            continue
+        scored = ~np.isnan(actual[rows])
+        for name in models:
+            start = time.perf_counter()
+            predicted = FORECASTERS[name](train[rows], horizon)
+            seconds[name] += time.perf_counter() - start
+            errors[name].append((predicted - actual[rows])[scored])
+        for name, predictions in (baselines or {}).items():
+            predicted = predictions[rows, origin:origin + horizon]
+            # A baseline without a prediction for a cell is charged the naive forecast there
+            predicted = np.where(np.isnan(predicted), forecast_naive(train[rows], horizon), predicted)
+            errors[name].append((predicted - actual[rows])[scored])
+
+    report = {}
+    for name, parts in errors.items():
+        values = np.concatenate(parts) if parts else np.empty(0)
+        values = values[~np.isnan(values)]
+        report[name] = {
+            "mae": float(np.mean(np.abs(values))) if len(values) else None,
+            "rmse": float(np.sqrt(np.mean(values ** 2))) if len(values) else None,
+            "points": int(len(values)),
+            "seconds": seconds[name],
+        }
+    return report
+
+
+def substitute_values(cube, values):
+    """A cube with the same cells whose counted advisories measure values[id] instead of their patch time.
+
+    Used to roll per-advisory predictions (e.g. the LSTM's) up into the same
+    monthly series as the actual patch times.
+    """
+    other = RollupCube(cube.unit, cube.max_patch_time, cube.whole)
+    other.values, other.codes, other.cells, other.cell_codes = cube.values, cube.codes, cube.cells, cube.cell_codes
+    other.count, other.sum, other.sum_sq = (np.zeros(len(cube.cell_codes)) for _ in range(3))
+    for advisory, (cells, _, _, value, _) in cube.advisories.items():
+        if value is not None and advisory in values:
+            other.apply(cells, values[advisory], 1)
+    return other
+
+
+def lstm_matrix(cube, data_list, model_path, by, keys, months):
+    """Monthly means of the saved LSTM's per-advisory predictions, aligned with an actual series matrix."""
+    # Imported here so the classical models never pay for TensorFlow
+    from patchmodel import PatchTimeModel
+    data_list = sorted(data_list, key=lambda entry: entry.get("published") or "")
+    hours = PatchTimeModel.load(model_path).predict(data_list)
+    scale = UNITS["hours"] / UNITS[cube.unit]
+    values = {entry.get("id"): value * scale for entry, value in zip(data_list, hours.tolist())}
+    return series_matrix(substitute_values(cube, values), by, 0, keys, months)[2]
+
+
+def check_lstm_cutoff(model_path, month):
+    """Raises ValueError unless the saved LSTM was trained only on advisories published before month.
+
+    A model that saw the backtested months would be scored on data it was
+    trained on, which makes it look far better than the classical models.
+    """
+    # Imported here so the classical models never pay for TensorFlow
+    from patchmodel import read_metadata
+    trained_until = read_metadata(model_path).get("trained_until")
+    if not trained_until:
+        raise ValueError(f"{model_path} does not record when its training data ends; retrain it with LSTM.py")
+    if trained_until[:7] >= month:
+        raise ValueError(f"{model_path} was trained on advisories up to {trained_until}, but the backtest "
+                         f"starts forecasting at {month}; train it on advisories published before {month}")
+
+
+def format_report(report, unit):
+    lines = []
+    for name, scores in sorted(report.items(), key=lambda item: item[1]["mae"] if item[1]["mae"] is not None
+                               else float("inf")):
+        if scores["mae"] is None:
+            lines.append(f"{name:>6}: no points")
+            continue
+        lines.append(f"{name:>6}: MAE {scores['mae']:10.2f} RMSE {scores['rmse']:10.2f} {unit} "
+                     f"over {scores['points']} points ({scores['seconds'] * 1000:.1f} ms)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast monthly patch times per groupId/CWE with classical "
+                                                 "models and backtest them against the LSTM.")
+    parser.add_argument("source", help="Folder, glob, zip or advisory store, or a cube file (.npz)")
+    parser.add_argument("--by", default="group_id", choices=["group_id", "cwe", "severity"])
+    parser.add_argument("--unit", default="hours", choices=list(UNITS))
+    parser.add_argument("--horizon", type=int, default=3, help="months to forecast")
+    parser.add_argument("--folds", type=int, default=6, help="forecast origins in the backtest")
+    parser.add_argument("--min-points", type=int, default=MIN_POINTS)
+    parser.add_argument("--lstm-model", default=None,
+                        help="artifact folder of a saved LSTM to compare against; it must have been trained on "
+                             "advisories published before the first backtested month")
+    parser.add_argument("--output", default=None, help="write the forecasts of the best model as JSON")
+    args = parser.parse_args()
+
+    data_list = []
+    if args.source.endswith(".npz"):
+        cube = RollupCube.load(args.source)
+    else:
+        from loader import load_json_files
+        fields = CUBE_FIELDS + ", affected.versions, severity" if args.lstm_model else CUBE_FIELDS
+        data_list, load_errors = load_json_files(args.source, flatten=True, fields=fields)
+        for file, error in load_errors:
+            print(f"Error loading file {file}: {error}")
+        cube = RollupCube(args.unit)
+        cube.update(data_list)
+
+    keys, months, matrix = series_matrix(cube, args.by, args.min_points)
+    print(f"{len(keys)} series by {args.by} over {len(months)} months")
+    baselines = {}
+    if args.lstm_model:
+        if not data_list:
+            parser.error("--lstm-model needs the advisories, not a cube file")
+        origins = backtest_origins(len(months), args.horizon, args.folds, args.min_points)
+        if len(origins) == 0:
+            parser.error("not enough months to backtest against the LSTM")
+        try:
+            check_lstm_cutoff(args.lstm_model, months[origins[0]])
+        except ValueError as e:
+            parser.error(str(e))
+        baselines["lstm"] = lstm_matrix(cube, data_list, args.lstm_model, args.by, keys, months)
+    report = backtest(matrix, args.horizon, args.folds, MODELS, args.min_points, baselines)
+    print(format_report(report, cube.unit))
+
+    if args.output:
+        scored = [name for name in MODELS if report[name]["mae"] is not None]
+        best = min(scored, key=lambda name: report[name]["mae"]) if scored else "naive"
+        start = time.perf_counter()
+        forecasts = FORECASTERS[best](matrix, args.horizon)
+        print(f"Forecast {len(keys)} series with {best} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        future = np.arange(np.datetime64(months[-1], "M") + 1, np.datetime64(months[-1], "M") + 1 + args.horizon)
+        result = {"model": best, "unit": cube.unit, "months": [str(month) for month in future],
+                  "forecasts": {key: row for key, row in zip(keys, forecasts.tolist())}}
+        write_atomic(args.output, json.dumps(result, indent=2), "w")
+        print(f"Wrote forecasts to {args.output}")
@@ -0,0 +1,252 @@
+import glob
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+from decoding import ProjectedParser, loads, parse_projection
+from metrics import METRICS
+
+# Number of files handed to a worker at a time. Big enough that the pool overhead
+# is small next to the parsing, small enough that the cores stay evenly loaded.
+DEFAULT_CHUNK_SIZE = 64
+
+# Files inside a zip archive are addressed as "<archive>.zip!/<member>"
+ZIP_MEMBER_SEPARATOR = "!/"
+
+
+def list_json_files(source):
+    """Lists the JSON files in a folder (or matching a glob pattern) in sorted order."""
+    if os.path.isdir(source):
+        source = os.path.join(source, "*.json")
+    return sorted(glob.glob(source))
+
+
+def is_zip_archive(path):
+    """Checks whether a path is a zip archive file."""
+    return path.lower().endswith(".zip") and os.path.isfile(path)
+
+
+def list_zip_members(archive_path):
+    """Lists the JSON members of a zip archive, skipping folders and macOS metadata."""
+    with zipfile.ZipFile(archive_path) as archive:
+        names = [info.filename for info in archive.infolist()
+                 if not info.is_dir() and info.filename.endswith(".json")
+                 and not info.filename.startswith("__MACOSX/")
+                 and not os.path.basename(info.filename).startswith("._")]
+    return [archive_path + ZIP_MEMBER_SEPARATOR + name for name in sorted(names)]
+
+
+def list_dataset_files(source):
+    """Lists the advisory files of a dataset source in a deterministic order.
+
+    source can be a folder or glob pattern of JSON files, a zip archive, or a folder
+    holding zip archives (whose members are listed after the folder's own JSON files).
+    """
+    if is_zip_archive(source):
+        return list_zip_members(source)
+    files = list_json_files(source)
+    if os.path.isdir(source):
+        for archive_path in sorted(glob.glob(os.path.join(source, "*.zip"))):
+            files.extend(list_zip_members(archive_path))
+    return files
+
+
+@lru_cache(maxsize=16)
+def open_archive(archive_path):
+    """Opens a zip archive once per process, so its central directory is only read once."""
+    return zipfile.ZipFile(archive_path)
+
+
+def read_bytes(path):
+    """Reads the raw content of a file or of a "<archive>.zip!/<member>" entry."""
+    if ZIP_MEMBER_SEPARATOR in path:
+        archive_path, member = path.split(ZIP_MEMBER_SEPARATOR, 1)
+        return open_archive(archive_path).read(member)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def file_size(path):
+    """Returns the size in bytes of a file or zip member."""
+    if ZIP_MEMBER_SEPARATOR in path:
+        archive_path, member = path.split(ZIP_MEMBER_SEPARATOR, 1)
+        return open_archive(archive_path).getinfo(member).file_size
+    return os.path.getsize(path)
+
+
+def file_signature(path):
+    """What the manifest compares to spot a change: size and mtime of a file, size and CRC of a zip member."""
+    if ZIP_MEMBER_SEPARATOR in path:
+        archive_path, member = path.split(ZIP_MEMBER_SEPARATOR, 1)
+        info = open_archive(archive_path).getinfo(member)
+        return {"size": info.file_size, "crc": info.CRC}
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parse_file(path):
+    """Parses a single JSON file and returns (path, data, error)."""
+    try:
+        return path, loads(read_bytes(path)), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def parse_chunk(paths, parser=parse_file):
+    """Parses a batch of files inside one worker process."""
+    return [parser(path) for path in paths]
+
+
+def split_chunks(items, chunk_size):
+    """Splits a list into consecutive chunks of at most chunk_size items."""
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def parse_files(paths, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, parser=parse_file, schedule="static"):
+    """Parses files over a process pool and returns (path, data, error) tuples in input order.
+
+    parser must be a module-level function so it can be sent to the worker processes.
+    schedule="static" hands out fixed chunks of chunk_size files; schedule="steal"
+    cuts the files into batches of similar size in bytes, and at most chunk_size
+    files, that idle workers pull (see sharding.run_work_stealing), which suits
+    datasets whose file sizes vary a lot.
+    """
+    if schedule not in ("static", "steal"):
+        raise ValueError(f"Unknown schedule {schedule!r}: expected 'static' or 'steal'")
+    paths = list(paths)
+    chunks = split_chunks(paths, chunk_size)
+
+    # A pool is not worth starting for a single chunk (or when asked to stay serial)
+    if workers == 1 or len(chunks) <= 1:
+        return [result for chunk in chunks for result in parse_chunk(chunk, parser)]
+
+    if schedule == "steal":
+        # Imported here because sharding builds on this module
+        from sharding import run_work_stealing
+        return run_work_stealing(paths, partial(parse_chunk, parser=parser), workers, max_batch_files=chunk_size)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields chunk results in submission order, so the output is deterministic
+        for chunk_results in pool.map(partial(parse_chunk, parser=parser), chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def iter_parsed_files(paths, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, parser=parse_file):
+    """Like parse_files, but yields the (path, data, error) tuples as their chunks finish, in input order.
+
+    Only a couple of chunks per worker are in flight at a time, so memory is
+    bounded by the chunks being parsed rather than by the whole source.
+    """
+    chunks = split_chunks(list(paths), chunk_size)
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from parse_chunk(chunk, parser)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = 2 * (workers or os.cpu_count() or 1)
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk, parser))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def flatten_results(results, flatten=False):
+    """Yields the (path, data, error) tuples of parsed files, one per record.
+
+    With flatten=True the items of files whose root is a list are yielded one
+    by one and any other non-object root becomes an error.
+    """
+    for path, data, error in results:
+        if error is None and flatten and isinstance(data, list):
+            for item in data:
+                yield path, item, None
+        elif error is None and flatten and not isinstance(data, dict):
+            yield path, None, "Invalid JSON structure"
+        else:
+            yield path, data, error
+
+
+def is_store(source):
+    """Checks whether a path is an advisory store folder written by advisorystore.py."""
+    return os.path.isdir(source) and os.path.isfile(os.path.join(source, "meta.json"))
+
+
+def iter_json_files(source, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, flatten=False, fields=None):
+    """Yields the (path, record, error) of every record of a source as it is parsed.
+
+    Takes the same sources as load_json_files but never holds more than a few
+    chunks of files, so a consumer can start on the first records straight away.
+    error is None for records and a message for files that could not be read.
+    """
+    if is_store(source):
+        # Imported here so plain JSON loading does not need numpy
+        from advisorystore import open_store
+        store = open_store(source)
+        tree = parse_projection(fields) if fields else {}
+        for i in range(len(store)):
+            yield source, store.record(i, tree), None
+        return
+    parser = ProjectedParser(fields) if fields else parse_file
+    yield from flatten_results(iter_parsed_files(list_dataset_files(source), workers, chunk_size, parser), flatten)
+
+
+def load_json_files(source, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, flatten=False, incremental=False,
+                    fields=None, shard=None, schedule="static"):
+    """Loads JSON files into a list, returning (data_list, errors).
+
+    errors is a list of (path, message) tuples for files that could not be read.
+    With flatten=True, files whose root is a list contribute each of their items.
+    source is anything list_dataset_files accepts, or an advisory store folder
+    written by advisorystore.py. With incremental=True, only files and zip members
+    that changed since the last run are parsed (see manifest.py); a zip archive
+    given as the source itself is always read directly. fields is an optional projection such as
+    "published, affected.ranges.events" limiting what is kept of each record.
+    shard=(i, N) only loads the advisories that sharding.shard_of assigns to shard i.
+    schedule picks how files are spread over the workers (see parse_files).
+    """
+    with METRICS.stage("load") as stage:
+        tree = parse_projection(fields) if fields else {}
+
+        if is_store(source):
+            # Imported here so plain JSON loading does not need numpy
+            from advisorystore import open_store
+            store = open_store(source)
+            # Only the projected columns are decoded, so unread fields such as details are never built
+            records = [store.record(i, tree) for i in store.shard_indices(shard)] if shard else store.records(tree)
+            stage.add(len(records))
+            METRICS.count("records_loaded_total", len(records))
+            return records, []
+
+        if incremental and not is_zip_archive(source):
+            from manifest import load_incremental
+            results, _ = load_incremental(source, workers, chunk_size, shard, schedule, fields)
+        else:
+            paths = list_dataset_files(source)
+            if shard:
+                from sharding import select_shard
+                paths = select_shard(paths, shard)
+            parser = ProjectedParser(fields) if fields else parse_file
+            results = parse_files(paths, workers, chunk_size, parser=parser, schedule=schedule)
+
+        data_list = []
+        errors = []
+        for path, data, error in flatten_results(results, flatten):
+            if error is not None:
+                errors.append((path, error))
+            else:
+                data_list.append(data)
+
+        stage.add(len(data_list))
+        METRICS.count("files_read_total", len(results))
+        METRICS.count("bytes_read_total", sum(file_size(path) for path, _, error in results if error is None))
+        METRICS.count("load_errors_total", len(errors))
+        METRICS.count("records_loaded_total", len(data_list))
+        return data_list, errors
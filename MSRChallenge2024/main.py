@@ -1,48 +1,192 @@
+import argparse
 import json
-import glob
 import os
-import shutil
+
+from decoding import ProjectedParser
+from loader import file_signature, list_json_files, parse_files, split_chunks
+from metrics import METRICS, get_logger
 
 #  path to the folder containing the JSON files
 json_folder_path = '/Users/jaydencruz/PycharmProjects/MSRChallenge'
 
-# path to the new folder where files will be moved
-processed_folder_path = os.path.join(json_folder_path, 'processed_files')
-os.makedirs(processed_folder_path, exist_ok=True)  # Create the folder if it doesn't exist
+# Severities that are kept (moved to processed_files); everything else is deleted
+KEEP_SEVERITIES = ['HIGH', 'CRITICAL']
+
+# Append-only record of every triage decision, kept in the folder being triaged
+JOURNAL_FILE = 'triage_journal.jsonl'
+
+# Number of moves/deletes applied between two journal syncs
+APPLY_BATCH_SIZE = 1000
+
+log = get_logger('triage')
+
+
+def read_journal(journal_path):
+    """Reads a triage journal, returning ({file: decision}, set of files already applied)."""
+    decisions = {}
+    done = set()
+    if not os.path.exists(journal_path):
+        return decisions, done
 
-# Get all JSON files in the specified folder
-json_files = glob.glob(os.path.join(json_folder_path, '*.json'))
+    with open(journal_path, 'r') as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interruption
+            if record.get('op') == 'decide':
+                decisions[record['file']] = record
+                done.discard(record['file'])  # The file was triaged again after it reappeared
+            elif record.get('op') == 'done':
+                done.add(record['file'])
+    return decisions, done
 
-# List to hold data from all JSON files
-data_list = []
 
-# Loop through each JSON file
-for file_path in json_files:
+def end_partial_line(journal_path):
+    """Terminates a last line left unfinished by an interruption so new records start on their own line."""
+    if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+        with open(journal_path, 'rb+') as journal:
+            journal.seek(-1, os.SEEK_END)
+            if journal.read(1) != b'\n':
+                journal.write(b'\n')
+
+
+def append_journal(journal, records):
+    """Appends records to the journal and forces them to disk."""
+    for record in records:
+        journal.write(json.dumps(record) + '\n')
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def is_current(decision, path):
+    """True if the file still has the size and mtime recorded with its decision, as the manifest checks."""
+    if decision is None:
+        return False
     try:
-        with open(file_path, 'r') as file:
-            data = json.load(file)  # Load the JSON data
+        signature = file_signature(path)
+    except OSError:
+        return False
+    return all(decision.get(key) == value for key, value in signature.items())
+
+
+def classify_files(folder_path, pending, workers=None, schedule="static"):
+    """Classifies every JSON file without a current pending decision, in parallel, and returns the new decisions.
 
+    A file that changed since its pending decision was journaled is classified again.
+    """
+    json_files = [path for path in list_json_files(folder_path)
+                  if not is_current(pending.get(os.path.basename(path)), path)]
+    # Taken before parsing, so a file rewritten meanwhile no longer matches its decision
+    signatures = {}
+    for path in json_files:
+        try:
+            signatures[path] = file_signature(path)
+        except OSError:
+            pass  # Removed since it was listed
+    json_files = [path for path in json_files if path in signatures]
+
+    decisions = []
+    # Only the severity is decoded into each worker's result
+    with METRICS.stage('triage_parse') as stage:
+        results = parse_files(json_files, workers, parser=ProjectedParser('database_specific.severity'),
+                              schedule=schedule)
+        stage.add(len(results))
+    for file_path, data, error in results:
+        if error is not None:
+            log.warning("Error processing file %s: %s", file_path, error)  # The file is left in place
+            METRICS.count('triage_errors_total')
+            continue
+        try:
             # Check the severity level in the 'database_specific' section
             severity = data.get('database_specific', {}).get('severity', '').upper()
+        except Exception as e:
+            log.warning("Error processing file %s: %s", file_path, e)
+            METRICS.count('triage_errors_total')
+            continue
+
+        action = 'move' if severity in KEEP_SEVERITIES else 'delete'
+        METRICS.count('triage_decisions_total', action=action)
+        decisions.append({'op': 'decide', 'file': os.path.basename(file_path), 'severity': severity, 'action': action,
+                          **signatures[file_path]})
+    return decisions
+
 
-            # If the severity is "HIGH" or "CRITICAL", process it
-            if severity in ['HIGH', 'CRITICAL']:
-                data_list.append(data)  # Add the data to the list if it's of high or critical severity
-                print(
-                    f"Processed file: {file_path} with severity {severity}")  # Log the processed file path and severity
+def apply_decisions(folder_path, processed_folder_path, decisions, journal, batch_size=APPLY_BATCH_SIZE):
+    """Applies journaled decisions in batches, recording each finished batch; returns the number of files moved.
 
-                # Move the file to the new folder
-                new_file_path = os.path.join(processed_folder_path, os.path.basename(file_path))
-                shutil.move(file_path, new_file_path)  # Move the file
-                print(f"Moved file {file_path} to {new_file_path}")
+    A file whose size or mtime no longer matches its decision is left in place and
+    not recorded as done, so the next run classifies it again.
+    """
+    moved = 0
+    for batch in split_chunks(decisions, batch_size):
+        applied = []
+        for decision in batch:
+            source_path = os.path.join(folder_path, decision['file'])
+            if not os.path.exists(source_path):
+                applied.append(decision)
+                continue  # Already applied before an interruption
+            if not is_current(decision, source_path):
+                log.warning("Skipping %s: it changed after it was classified", decision['file'])
+                METRICS.count('triage_stale_total')
+                continue
 
+            if decision['action'] == 'move':
+                # Same-filesystem rename, so this is atomic and never copies data
+                os.replace(source_path, os.path.join(processed_folder_path, decision['file']))
+                moved += 1
             else:
-                print(f"Skipping file: {file_path} with severity {severity}")  # Log the skipped file
-                os.remove(file_path)
+                os.remove(source_path)
+            applied.append(decision)
+        append_journal(journal, [{'op': 'done', 'file': decision['file']} for decision in applied])
+    return moved
+
+
+def triage(folder_path, dry_run=False, workers=None, batch_size=APPLY_BATCH_SIZE, schedule="static"):
+    """Moves HIGH/CRITICAL advisories to processed_files and deletes the rest, resuming from the journal.
+
+    schedule picks how files are spread over the parser processes (see loader.parse_files).
+    """
+    # path to the new folder where files will be moved
+    processed_folder_path = os.path.join(folder_path, 'processed_files')
+    journal_path = os.path.join(folder_path, JOURNAL_FILE)
+
+    decisions, done = read_journal(journal_path)
+    pending = {name: decision for name, decision in decisions.items() if name not in done}
+    if pending:
+        log.info("Resuming with %d decisions from %s", len(pending), journal_path)
+
+    end_partial_line(journal_path)
+    with open(journal_path, 'a') as journal:
+        # Every decision is on disk before any file is touched
+        new_decisions = classify_files(folder_path, pending, workers, schedule)
+        append_journal(journal, new_decisions)
+        for decision in new_decisions:
+            pending[decision['file']] = decision
+
+        kept = sum(1 for decision in pending.values() if decision['action'] == 'move')
+        log.info("Classified %d files; %d of %d pending files are HIGH or CRITICAL.", len(new_decisions), kept,
+                 len(pending))
+        if dry_run:
+            log.info("Dry run: decisions written to %s, no files were changed.", journal_path)
+            return
+
+        os.makedirs(processed_folder_path, exist_ok=True)  # Create the folder if it doesn't exist
+        with METRICS.stage('triage_apply') as stage:
+            moved = apply_decisions(folder_path, processed_folder_path,
+                                    [pending[name] for name in sorted(pending)], journal, batch_size)
+            stage.add(len(pending))
+
+    log.info("Processed %d files with HIGH or CRITICAL severity.", moved)
 
-    except Exception as e:
-        print(f"Error processing file {file_path}: {e}")  # Handle any errors that occur
 
-# Example of accessing the aggregated data (optional)
-print(f"Processed {len(data_list)} files with HIGH or CRITICAL severity.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep HIGH/CRITICAL advisories and delete the rest.")
+    parser.add_argument("folder", nargs="?", default=json_folder_path, help="folder containing the JSON files")
+    parser.add_argument("--dry-run", action="store_true", help="only classify and write the journal")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes")
+    parser.add_argument("--schedule", default="static", choices=["static", "steal"],
+                        help="fixed chunks per worker, or size-balanced batches pulled by idle workers")
+    args = parser.parse_args()
 
+    triage(args.folder, dry_run=args.dry_run, workers=args.workers, schedule=args.schedule)
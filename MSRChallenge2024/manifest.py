@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import pickle
+from functools import partial
+
+from decoding import loads, parse_projection, project
+from loader import DEFAULT_CHUNK_SIZE, file_signature, list_dataset_files, parse_files, read_bytes
+from sharding import select_shard
+
+# The manifest and the cache folder live next to the dataset. They start with a dot so
+# the "*.json" patterns used by the scripts never pick them up as advisories.
+MANIFEST_FILE = ".manifest.json"
+CACHE_FOLDER = ".manifest-cache"
+MANIFEST_VERSION = 1
+# The cache is split over this many pickle files by file name, so a run only rewrites
+# the buckets holding a changed file instead of the whole cache.
+CACHE_BUCKETS = 64
+
+
+def dataset_folder(source):
+    """Returns the folder a dataset source (folder or glob pattern) lives in."""
+    return source if os.path.isdir(source) else os.path.dirname(source) or "."
+
+
+def hash_and_parse_file(path, tree=None):
+    """Reads a JSON file once and returns (path, (sha256, projected data), error).
+
+    The projection runs in the worker, so only the projected fields are sent
+    back and cached.
+    """
+    try:
+        content = read_bytes(path)
+        return path, (hashlib.sha256(content).hexdigest(), project(loads(content), tree or {})), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def manifest_paths(folder, shard=None):
+    """Returns the manifest path and cache folder; each shard of a folder keeps its own pair."""
+    manifest_file, cache_folder = MANIFEST_FILE, CACHE_FOLDER
+    if shard:
+        suffix = f"-{shard[0]}of{shard[1]}"
+        manifest_file = manifest_file.replace(".json", suffix + ".json")
+        cache_folder += suffix
+    return os.path.join(folder, manifest_file), os.path.join(folder, cache_folder)
+
+
+def projection_key(tree):
+    """Names the cache of one projection: records projected differently are cached apart."""
+    if not tree:
+        return "all"
+    return hashlib.sha1(json.dumps(tree, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_bucket(name):
+    """The cache bucket of a file name; stable across runs, unlike hash()."""
+    return int.from_bytes(hashlib.sha1(name.encode("utf-8")).digest()[:4], "big") % CACHE_BUCKETS
+
+
+def bucket_path(cache_path, bucket):
+    return os.path.join(cache_path, f"bucket-{bucket:02d}.pickle")
+
+
+def read_manifest(folder, shard=None):
+    """Reads the file entries of a dataset folder's manifest (empty if missing or unreadable)."""
+    manifest_path, _ = manifest_paths(folder, shard)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def read_cache(cache_path):
+    """Reads the cached {name: (sha256, record)} of one projection; unreadable buckets are left out."""
+    cache = {}
+    for bucket in range(CACHE_BUCKETS):
+        try:
+            with open(bucket_path(cache_path, bucket), "rb") as f:
+                cache.update(pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            continue
+    return cache
+
+
+def write_atomic(path, content, mode):
+    """Writes a file through a temporary name so a crash never leaves it half written."""
+    temp_path = path + ".tmp"
+    with open(temp_path, mode) as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def write_manifest(folder, files, shard=None):
+    """Writes the file entries of a dataset folder's manifest."""
+    manifest_path, cache_folder = manifest_paths(folder, shard)
+    manifest = {"version": MANIFEST_VERSION, "files": files}
+    write_atomic(manifest_path, json.dumps(manifest, indent=2, sort_keys=True), "w")
+    # The single-file cache of earlier versions sat next to the cache folder
+    if os.path.exists(cache_folder + ".pickle"):
+        os.remove(cache_folder + ".pickle")
+
+
+def write_cache(cache_path, cache, changed):
+    """Rewrites the cache buckets holding any of the changed (added, modified or removed) names."""
+    buckets = {cache_bucket(name) for name in changed}
+    if not buckets:
+        return
+    os.makedirs(cache_path, exist_ok=True)
+    contents = {bucket: {} for bucket in buckets}
+    for name, entry in cache.items():
+        bucket = cache_bucket(name)
+        if bucket in contents:
+            contents[bucket][name] = entry
+    for bucket, entries in contents.items():
+        write_atomic(bucket_path(cache_path, bucket), pickle.dumps(entries, pickle.HIGHEST_PROTOCOL), "wb")
+
+
+def load_incremental(source, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, shard=None, schedule="static",
+                     fields=None):
+    """Loads a dataset, parsing only files that are new or changed since the last run.
+
+    Returns (results, changes): results are (path, data, error) tuples in file order,
+    like loader.parse_files, and changes maps "added", "modified", "removed" and
+    "unchanged" to lists of file names. shard=(i, N) restricts the load to one
+    hash shard, which then has its own manifest and cache. schedule is passed on to
+    loader.parse_files. fields is a projection such as "published, affected.ranges.events";
+    only the projected records are cached, one cache per projection.
+    """
+    folder = dataset_folder(source)
+    tree = parse_projection(fields) if fields else {}
+    _, cache_folder = manifest_paths(folder, shard)
+    cache_path = os.path.join(cache_folder, projection_key(tree))
+    old_files = read_manifest(folder, shard)
+    old_cache = read_cache(cache_path)
+    # Zip members are named "<archive>.zip!/<member>" relative to the folder, like loose files
+    paths = list_dataset_files(source)
+    if shard:
+        paths = select_shard(paths, shard)
+    names = {path: os.path.relpath(path, folder) for path in paths}
+
+    # A file (or zip member) whose signature matches the manifest and whose record is cached for
+    # this projection is not read at all; anything else is re-read and re-parsed, then compared by
+    # content hash.
+    stats = {}
+    candidates = []
+    for path in paths:
+        name = names[path]
+        stats[name] = file_signature(path)
+        old = old_files.get(name)
+        if (old is None or any(old.get(key) != value for key, value in stats[name].items())
+                or old_cache.get(name, (None,))[0] != old["sha256"]):
+            candidates.append(path)
+
+    results = parse_files(candidates, workers, chunk_size, parser=partial(hash_and_parse_file, tree=tree),
+                          schedule=schedule)
+    parsed = {names[path]: (result, error) for path, result, error in results}
+
+    changes = {"added": [], "modified": [], "removed": [], "unchanged": []}
+    files = {}
+    cache = {}
+    failed = set()
+    results = []
+    for path in paths:
+        name = names[path]
+        if name not in parsed:
+            files[name] = old_files[name]
+            cache[name] = old_cache[name]
+            changes["unchanged"].append(name)
+        else:
+            result, error = parsed[name]
+            if error is not None:
+                # Not recorded, so the file is retried on the next run
+                failed.add(name)
+                results.append((path, None, error))
+                continue
+            digest, data = result
+            if name not in old_files:
+                changes["added"].append(name)
+            elif old_files[name]["sha256"] == digest:
+                changes["unchanged"].append(name)
+            else:
+                changes["modified"].append(name)
+            files[name] = dict(stats[name], sha256=digest)
+            cache[name] = (digest, data)
+        results.append((path, cache[name][1], None))
+
+    changes["removed"] = sorted(set(old_files) - set(files) - failed)
+    # Buckets are rewritten for new or re-parsed records and for records of files that are gone
+    write_cache(cache_path, cache, set(parsed) - failed | set(old_cache) - set(cache))
+    if files != old_files:
+        write_manifest(folder, files, shard)
+    return results, changes
@@ -0,0 +1,187 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PROMETHEUS_PREFIX = "msr_"
+# Set these to have every script write its metrics when it exits
+METRICS_JSON_ENV = "MSR_METRICS_JSON"
+METRICS_PROM_ENV = "MSR_METRICS_PROM"
+LOG_LEVEL_ENV = "MSR_LOG_LEVEL"
+
+# A message template may be logged this many times per interval before it is suppressed
+LOG_BURST = 20
+LOG_INTERVAL = 10.0
+
+
+def peak_memory_bytes():
+    """Peak resident memory of this process (None where the platform cannot tell)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage:
+    """Accumulated wall time, calls and processed items of one named stage."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.items = 0
+
+    def add(self, items):
+        """Counts items processed by the running stage (used for the items/s rate)."""
+        self.items += items
+
+    @property
+    def rate(self):
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+
+class Metrics:
+    """Stage timers and labelled counters for one run, dumpable as JSON or Prometheus text."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}  # (name, sorted label items) -> value
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block: `with METRICS.stage("load") as stage: ... stage.add(len(records))`."""
+        stage = self.stages.setdefault(name, Stage())
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            stage.calls += 1
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def to_dict(self):
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "run_seconds": time.time() - self.started,
+            "peak_memory_bytes": peak_memory_bytes(),
+            "stages": {name: {"seconds": stage.seconds, "calls": stage.calls, "items": stage.items,
+                              "items_per_second": stage.rate}
+                       for name, stage in self.stages.items()},
+            "counters": counters,
+        }
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append(f"# TYPE {prefix}{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels)
+                lines.append(f"{prefix}{name}{{{label_text}}} {value}" if label_text else f"{prefix}{name} {value}")
+
+        metric("run_seconds", "gauge", [((), time.time() - self.started)])
+        peak = peak_memory_bytes()
+        if peak is not None:
+            metric("peak_memory_bytes", "gauge", [((), peak)])
+        stages = sorted(self.stages.items())
+        metric("stage_seconds_total", "counter", [((("stage", n),), s.seconds) for n, s in stages])
+        metric("stage_calls_total", "counter", [((("stage", n),), s.calls) for n, s in stages])
+        metric("stage_items_total", "counter", [((("stage", n),), s.items) for n, s in stages])
+        metric("stage_items_per_second", "gauge", [((("stage", n),), s.rate) for n, s in stages])
+        by_name = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name, samples in by_name.items():
+            metric(name, "counter", samples)
+        return "\n".join(lines) + "\n"
+
+    def dump(self, json_path=None, prom_path=None):
+        """Writes the metrics to the given files (either may be None)."""
+        # Imported here because manifest (through loader) reports to this module
+        from manifest import write_atomic
+        if json_path:
+            write_atomic(json_path, json.dumps(self.to_dict(), indent=2), "w")
+        if prom_path:
+            write_atomic(prom_path, self.to_prometheus(), "w")
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# The registry every module reports to
+METRICS = Metrics()
+
+
+def dump_from_env():
+    """Writes METRICS to $MSR_METRICS_JSON / $MSR_METRICS_PROM, from the main process only."""
+    if multiprocessing.parent_process() is not None:
+        return
+    METRICS.dump(os.environ.get(METRICS_JSON_ENV), os.environ.get(METRICS_PROM_ENV))
+
+
+if os.environ.get(METRICS_JSON_ENV) or os.environ.get(METRICS_PROM_ENV):
+    atexit.register(dump_from_env)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets each message template through at most `burst` times per `interval` seconds.
+
+    Suppressed messages are counted in the log_messages_suppressed_total metric and
+    announced once the template is allowed through again.
+    """
+
+    def __init__(self, burst=LOG_BURST, interval=LOG_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # (logger, template) -> [window start, messages, suppressed]
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            window = self.windows[key] = [now, 0, 0]
+            if suppressed:
+                record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        window[1] += 1
+        if window[1] > self.burst:
+            window[2] += 1
+            METRICS.count("log_messages_suppressed_total", logger=record.name)
+            return False
+        return True
+
+
+def get_logger(name):
+    """Returns the leveled, rate-limited logger of a module ($MSR_LOG_LEVEL sets the level)."""
+    root = logging.getLogger("msr")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        handler.addFilter(RateLimitFilter())
+        root.addHandler(handler)
+        root.setLevel(os.environ.get(LOG_LEVEL_ENV, "INFO").upper())
+        root.propagate = False
+    return root.getChild(name)
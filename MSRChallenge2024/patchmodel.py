@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cvss import COLUMN_INDEX, advisory_columns
+from loader import load_json_files
+from manifest import write_atomic
+from metrics import METRICS, get_logger
+
+# Bumped whenever the layout of metadata.json changes; older artifacts are refused
+ARTIFACT_VERSION = 2
+METADATA_FILE = "metadata.json"
+DEFAULT_MODEL_PATH = "patch_time_model"
+# The LSTM inputs, in column order
+FEATURES = ["cvss_base_score", "versions_length"]
+PREDICT_FIELDS = "id, published, affected.versions, severity"
+
+log = get_logger("patchmodel")
+
+
+def feature_matrix(data_list):
+    """The model inputs (see FEATURES) of a list of advisories, one row per advisory."""
+    scores = np.nan_to_num(advisory_columns(data_list)[:, COLUMN_INDEX["base_score"]], nan=0.0)
+    versions = [sum(len(item.get("versions") or []) for item in entry.get("affected") or []) for entry in data_list]
+    return np.column_stack([scores, np.array(versions, dtype=float)])
+
+
+def scaler_params(scaler):
+    """The part of a fitted MinMaxScaler needed to apply it: x * scale + min."""
+    return {"min": scaler.min_.tolist(), "scale": scaler.scale_.tolist()}
+
+
+def save_model(path, model, feature_scaler, target_scaler, sequence_length, history, **info):
+    """Saves a trained LSTM and its scalers as a versioned artifact folder.
+
+    history holds the scaled feature rows of the training data; its last
+    sequence_length - 1 rows are kept so the first advisories of a batch have
+    a full window. The model file is written first and metadata.json replaced
+    atomically last, so a reader never sees a half written artifact.
+    """
+    os.makedirs(path, exist_ok=True)
+    created = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    model_file = f"model-{created}.keras"
+    model.save(os.path.join(path, model_file))
+    previous = read_metadata(path) if os.path.exists(os.path.join(path, METADATA_FILE)) else None
+    metadata = {
+        "version": ARTIFACT_VERSION,
+        "created": created,
+        "model_file": model_file,
+        "sequence_length": sequence_length,
+        "features": FEATURES,
+        "unit": "hours",
+        "feature_scaler": scaler_params(feature_scaler),
+        "target_scaler": scaler_params(target_scaler),
+        "history": history_rows(history, sequence_length).tolist(),
+        **info,
+    }
+    write_atomic(os.path.join(path, METADATA_FILE), json.dumps(metadata, indent=2), "w")
+    if previous and previous["model_file"] != model_file:
+        try:
+            os.remove(os.path.join(path, previous["model_file"]))
+        except OSError:
+            pass
+    return metadata
+
+
+def history_rows(features, sequence_length):
+    """The last sequence_length - 1 rows of features, which precede a new advisory in its window."""
+    features = np.asarray(features, dtype=float)
+    return features[len(features) - min(len(features), sequence_length - 1):]
+
+
+def read_metadata(path):
+    with open(os.path.join(path, METADATA_FILE), "r") as f:
+        metadata = json.load(f)
+    if metadata.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"{path} is a version {metadata.get('version')} artifact, expected {ARTIFACT_VERSION}")
+    return metadata
+
+
+class PatchTimeModel:
+    """A trained patch-time LSTM loaded once and reused for every batch.
+
+    As in training, an advisory's patch time is predicted from a window of
+    sequence_length rows ending with its own: the batch's earlier rows, preceded
+    by the last training rows, so even a batch of one advisory gets a full window.
+    """
+
+    def __init__(self, model, metadata):
+        self.model = model
+        self.metadata = metadata
+        self.sequence_length = metadata["sequence_length"]
+        self.feature_min = np.array(metadata["feature_scaler"]["min"])
+        self.feature_scale = np.array(metadata["feature_scaler"]["scale"])
+        self.target_min = metadata["target_scaler"]["min"][0]
+        self.target_scale = metadata["target_scaler"]["scale"][0]
+        self.history = history_rows(np.reshape(metadata["history"], (-1, len(FEATURES))), self.sequence_length)
+        if len(self.history) != self.sequence_length - 1:
+            raise ValueError(f"artifact has {len(self.history)} history rows, expected {self.sequence_length - 1}")
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        # Imported here so feature_matrix and the metadata can be used without TensorFlow
+        import tensorflow as tf
+        metadata = read_metadata(path)
+        model = tf.keras.models.load_model(os.path.join(path, metadata["model_file"]))
+        return cls(model, metadata)
+
+    def windows(self, features):
+        """The scaled input window of every row of features, ending with that row, as a strided view."""
+        scaled = np.concatenate([self.history, features * self.feature_scale + self.feature_min])
+        return sliding_window_view(scaled, self.sequence_length, axis=0).swapaxes(1, 2)
+
+    def predict_features(self, features):
+        """Predicted patch times in hours for a (n, len(FEATURES)) feature array."""
+        if len(features) == 0:
+            return np.empty(0)
+        windows = np.ascontiguousarray(self.windows(np.asarray(features, dtype=float)), dtype=np.float32)
+        # Calling the model directly skips the per-call setup of model.predict, which dominates small batches
+        scaled = np.asarray(self.model(windows, training=False)).reshape(-1)
+        return (scaled - self.target_min) / self.target_scale
+
+    def predict(self, data_list):
+        """Predicted patch times in hours for a batch of advisories, in the given order."""
+        with METRICS.stage("predict") as stage:
+            predictions = self.predict_features(feature_matrix(data_list))
+            stage.add(len(data_list))
+        return predictions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict patch times of new advisories with a saved LSTM.")
+    parser.add_argument("source", help="Folder, glob, zip or advisory store of new advisories")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Artifact folder written by LSTM.py")
+    parser.add_argument("--sort", action="store_true", help="Predict in order of publication")
+    args = parser.parse_args()
+
+    patch_model = PatchTimeModel.load(args.model)
+    data_list, load_errors = load_json_files(args.source, flatten=True, fields=PREDICT_FIELDS)
+    for file, error in load_errors:
+        log.error("Error loading file %s: %s", file, error)
+    if args.sort:
+        data_list.sort(key=lambda entry: entry.get("published") or "")
+    start = time.perf_counter()
+    predictions = patch_model.predict(data_list)
+    log.info("Predicted %d advisories in %.1f ms", len(data_list), (time.perf_counter() - start) * 1000)
+    for entry, hours in zip(data_list, predictions):
+        print(f"{entry.get('id', 'Unknown')}\t{hours:.2f}")
@@ -0,0 +1,251 @@
+import re
+from collections.abc import Sequence
+
+import numpy as np
+
+from metrics import METRICS
+from streamstats import PatchTimeStats
+
+# Fixed versions with a known release date; anything else goes through the
+# dynamic mapping built from the advisories themselves
+STATIC_VERSION_DATES = {
+    "2.4.0": "2020-05-01T00:00:00Z",
+    "4.3.1": "2021-08-01T00:00:00Z",
+    "7.0.1": "2022-01-01T00:00:00Z",
+}
+
+# Advisories run through the engine at a time when only their statistics are kept
+STATS_CHUNK_SIZE = 8192
+
+# Seconds per unit a patch time can be reported in
+UNITS = {"seconds": 1, "minutes": 60, "hours": 60 * 60, "days": 60 * 60 * 24}
+
+# The two timestamp formats the scripts accept ("%Y-%m-%dT%H:%M:%S.%fZ" and "%Y-%m-%dT%H:%M:%SZ")
+ISO_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?Z$")
+
+# Status codes, in the order the scripts check them
+OK = 0
+NO_PUBLISHED = 1
+NO_FIXED = 2
+NO_MAPPING = 3
+INVALID_PUBLISHED = 4
+FIXED_BEFORE_PUBLISHED = 5
+TOO_LARGE = 6
+
+REASONS = {
+    NO_PUBLISHED: "Published date not found",
+    NO_FIXED: "Fixed date not found",
+    NO_MAPPING: "No date mapping for version {fixed}",
+    INVALID_PUBLISHED: "Invalid published date",
+    FIXED_BEFORE_PUBLISHED: "Fixed date is earlier than published date",
+    TOO_LARGE: "Patch time too large",
+}
+
+
+def timestamp_key(timestamp):
+    """Sort key of an OSV timestamp: without the trailing Z, "...:51" sorts before "...:51.5"."""
+    return timestamp[:-1] if timestamp.endswith("Z") else timestamp
+
+
+def add_mapping_date(mapping, version, published):
+    """Records published for a fixed version unless an earlier date is already there; True if it changed."""
+    current = mapping.get(version)
+    if current is not None and timestamp_key(current) <= timestamp_key(published):
+        return False
+    mapping[version] = published
+    return True
+
+
+def merge_dynamic_mappings(mapping, other):
+    """Folds another dynamic mapping into mapping (earliest date wins) and returns the versions redated."""
+    return {version for version, published in other.items() if add_mapping_date(mapping, version, published)}
+
+
+def build_dynamic_mapping(data_list):
+    """Maps every fixed version to the published date of the earliest advisory that fixes it.
+
+    Taking the earliest date makes the mapping independent of the order the
+    advisories are read in, so shards or batches can be mapped separately and
+    merged.
+    """
+    mapping = {}
+    for entry in data_list:
+        published = entry.get("published")
+        if published:
+            for item in entry.get("affected", []):
+                for range_info in item.get("ranges", []):
+                    for event in range_info.get("events", []):
+                        if "fixed" in event:
+                            add_mapping_date(mapping, event["fixed"], published)
+    return mapping
+
+
+def first_fixed(entry):
+    """Returns (package name, first fixed event value) of an advisory, or (None, None)."""
+    for item in entry.get("affected", []):
+        for range_info in item.get("ranges", []):
+            for event in range_info.get("events", []):
+                if event.get("fixed"):
+                    return item.get("package", {}).get("name"), event["fixed"]
+    return None, None
+
+
+def to_datetime64(timestamps):
+    """Converts ISO timestamps to a datetime64[us] array, with NaT for missing or invalid values."""
+    valid = np.array([isinstance(t, str) and ISO_TIMESTAMP.match(t) is not None for t in timestamps], dtype=bool)
+    result = np.full(len(timestamps), np.datetime64("NaT"), dtype="datetime64[us]")
+    strings = [t[:-1] for t, ok in zip(timestamps, valid) if ok]
+    try:
+        result[valid] = np.array(strings, dtype="datetime64[us]")
+    except ValueError:
+        # A well-formed but impossible date (e.g. month 13): fall back to one at a time
+        for i in np.flatnonzero(valid):
+            try:
+                result[i] = np.datetime64(timestamps[i][:-1], "us")
+            except ValueError:
+                pass
+    return result
+
+
+def resolve_fixed(fixed_versions, dynamic_mapping, static_mapping=STATIC_VERSION_DATES, packages=None,
+                  resolver=None):
+    """Turns fixed event values into timestamps: kept if already a timestamp, else looked up by version.
+
+    With a versiondates.VersionDateResolver, the real release date of the package's
+    version is tried before the static and dynamic mappings.
+    """
+    resolved = []
+    for i, fixed in enumerate(fixed_versions):
+        if fixed is None or ISO_TIMESTAMP.match(fixed):
+            resolved.append(fixed)
+            continue
+        date = resolver.resolve(packages[i] or "", fixed) if resolver is not None else None
+        resolved.append(date or static_mapping.get(fixed) or dynamic_mapping.get(fixed))
+    return resolved
+
+
+class PatchTimes:
+    """Published/fixed timestamps of a set of advisories, with every check done as array operations."""
+
+    def __init__(self, ids, published, fixed_versions, dynamic_mapping, static_mapping=STATIC_VERSION_DATES,
+                 packages=None, resolver=None):
+        self.ids = np.array(ids, dtype=object)
+        self.fixed_versions = np.array(fixed_versions, dtype=object)
+        self.published = to_datetime64(published)
+        resolved = resolve_fixed(fixed_versions, dynamic_mapping, static_mapping, packages, resolver)
+        self.fixed = to_datetime64(resolved)
+
+        # Checks are applied last-to-first so the first failing check decides the reason
+        status = np.full(len(self.ids), OK, dtype=np.uint8)
+        status[self.fixed < self.published] = FIXED_BEFORE_PUBLISHED
+        status[np.isnat(self.published)] = INVALID_PUBLISHED
+        status[np.isnat(self.fixed)] = NO_MAPPING
+        status[np.array([f is None for f in fixed_versions], dtype=bool)] = NO_FIXED
+        status[np.array([not p for p in published], dtype=bool)] = NO_PUBLISHED
+        self.status = status
+
+    def durations(self, unit="minutes"):
+        """Returns fixed - published for every advisory in the given unit (NaN where unknown)."""
+        seconds = (self.fixed - self.published) / np.timedelta64(1, "s")
+        return seconds / UNITS[unit]
+
+    def evaluate(self, unit="minutes", max_patch_time=None, whole=False):
+        """Returns (patch times of the valid advisories, status of every advisory).
+
+        max_patch_time (in unit) rejects longer patch times as "Patch time too large";
+        whole=True floors to whole units like timedelta.days does.
+        """
+        durations = self.durations(unit)
+        if whole:
+            durations = np.floor(durations)
+        status = self.status.copy()
+        if max_patch_time is not None:
+            status[(status == OK) & (durations > max_patch_time)] = TOO_LARGE
+        return durations[status == OK], status
+
+    def stats(self, unit="minutes", max_patch_time=None, whole=False):
+        """Returns the mergeable moments/quantiles/histogram of the valid patch times."""
+        stats = PatchTimeStats()
+        stats.update(self.evaluate(unit, max_patch_time, whole)[0])
+        return stats
+
+    def skipped_entries(self, status):
+        """Lists (id, reason) for every rejected advisory, in input order."""
+        return [(self.ids[i], REASONS[status[i]].format(fixed=self.fixed_versions[i]))
+                for i in np.flatnonzero(status != OK)]
+
+    def log_rejects(self, status, reject_log):
+        """Writes every rejected advisory to a rejectlog.RejectLog, with the fixed version as a field."""
+        for i in np.flatnonzero(status != OK):
+            reason = REASONS[status[i]].replace(" {fixed}", "")
+            if self.fixed_versions[i] is None:
+                reject_log.add(self.ids[i], reason)
+            else:
+                reject_log.add(self.ids[i], reason, fixed=self.fixed_versions[i])
+
+
+def from_records(data_list, dynamic_mapping=None, static_mapping=STATIC_VERSION_DATES, resolver=None):
+    """Extracts the published and first fixed values of every advisory in a single pass."""
+    with METRICS.stage("patch_time") as stage:
+        if dynamic_mapping is None:
+            dynamic_mapping = build_dynamic_mapping(data_list)
+        ids = [entry.get("id") for entry in data_list]
+        published = [entry.get("published") for entry in data_list]
+        packages, fixed_versions = zip(*[first_fixed(entry) for entry in data_list]) if data_list else ((), ())
+        stage.add(len(ids))
+        return PatchTimes(ids, published, list(fixed_versions), dynamic_mapping, static_mapping, packages, resolver)
+
+
+def iter_patch_times(data_list, dynamic_mapping, static_mapping=STATIC_VERSION_DATES, resolver=None,
+                     chunk_size=STATS_CHUNK_SIZE):
+    """Runs advisories through the engine chunk_size at a time, yielding the PatchTimes of each chunk.
+
+    data_list can be any iterable of advisories, such as the records streamed by
+    loader.iter_json_files. A chunk cannot see the others, so the dynamic mapping
+    has to be built beforehand.
+    """
+    chunk = []
+    for entry in data_list:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            yield from_records(chunk, dynamic_mapping, static_mapping, resolver)
+            chunk = []
+    if chunk:
+        yield from_records(chunk, dynamic_mapping, static_mapping, resolver)
+
+
+def patch_time_stats(data_list, dynamic_mapping=None, unit="minutes", max_patch_time=None, whole=False,
+                     resolver=None, reject_log=None):
+    """Returns (PatchTimeStats of the valid patch times, skipped entries).
+
+    The advisories are evaluated chunk by chunk and each chunk's patch times
+    are folded into the statistics, so the per-advisory arrays of the whole
+    dataset are never held at once. With a reject_log the skipped entries are
+    written to it instead and the list is empty. Without a dynamic_mapping one is
+    built from data_list first, so an iterator is read into a list for the two passes.
+    """
+    if dynamic_mapping is None:
+        if not isinstance(data_list, Sequence):
+            data_list = list(data_list)
+        dynamic_mapping = build_dynamic_mapping(data_list)
+    stats = PatchTimeStats()
+    skipped_entries = []
+    for patch_times in iter_patch_times(data_list, dynamic_mapping, resolver=resolver):
+        values, status = patch_times.evaluate(unit, max_patch_time, whole)
+        stats.update(values)
+        if reject_log is not None:
+            patch_times.log_rejects(status, reject_log)
+        else:
+            skipped_entries.extend(patch_times.skipped_entries(status))
+    return stats, skipped_entries
+
+
+def average_patch_time(data_list, dynamic_mapping=None, unit="minutes", max_patch_time=None, whole=False,
+                       resolver=None, reject_log=None):
+    """Returns (average patch time, skipped entries) like the per-person time scripts.
+
+    With a reject_log the skipped entries are written to it instead and the list is empty.
+    """
+    stats, skipped_entries = patch_time_stats(data_list, dynamic_mapping, unit, max_patch_time, whole, resolver,
+                                              reject_log)
+    return (float(stats.moments.mean) if stats.count else 0), skipped_entries
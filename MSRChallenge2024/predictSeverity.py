@@ -1,89 +1,314 @@
-import os
-import glob
+import argparse
 import json
+import pickle
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import nltk
+from scipy.sparse import csr_matrix, hstack
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 
+from cvss import advisory_features
+from decoding import loads
+from loader import iter_json_files, load_json_files
+from manifest import write_atomic
+from metrics import METRICS, get_logger
+
 
-# Directory path where JSON files are located
+# Directory path where JSON files (or an advisory store) are located
 json_directory_path = "/Users/jaydencruz/PycharmProjects/MSRChallenge/Kimberly'sFiles"
 
-# Use glob to get all JSON files in the directory
-json_files = glob.glob(os.path.join(json_directory_path, "*.json"))
+# Bumped whenever the pickled artifact changes shape; older artifacts are refused
+MODEL_VERSION = 1
+DEFAULT_MODEL_PATH = "severity_model.pickle"
+SCORE_FIELDS = "id, summary, severity"
+# Advisories transformed and scored together
+BATCH_SIZE = 4096
+LABEL_NAMES = {2: "HIGH", 1: "MEDIUM", 0: "LOW", -1: "UNKNOWN"}
+
+log = get_logger("severity")
+
+
+def severity_to_label(severity):
+    """Converts a severity string to a numerical label (HIGH = 2, MEDIUM = 1, LOW = 0)."""
+    if isinstance(severity, str):
+        if severity.upper() == "HIGH":
+            return 2
+        elif severity.upper() == "MEDIUM":
+            return 1
+        elif severity.upper() == "LOW":
+            return 0
+    return -1  # Unknown severity
+
 
-# Check if we have any JSON files
-if not json_files:
-    print("No JSON files found in the directory.")
-else:
+def usable_records(data_list):
+    """The advisories the classifier can read (JSON objects); anything else is logged and dropped."""
+    records = []
+    for data in data_list:
+        if isinstance(data, dict):
+            records.append(data)
+        else:
+            log.error("Skipping a %s record: not an advisory object", type(data).__name__)
+    return records
+
+
+def load_training_data(data_list):
+    """Extracts (texts, labels) from the summary and severity of each advisory.
+
+    Every advisory object gets exactly one row, so the rows line up with
+    features built from usable_records(data_list).
+    """
     # Initialize lists to hold the extracted text and labels
     texts = []
     labels = []
 
-    # Process each JSON file in the directory
-    for json_file_path in json_files:
+    # Process each advisory
+    for data in usable_records(data_list):
+        # Extract the relevant fields (e.g., summary and severity)
+        summary = data.get("summary") or ""
+        severity = (data.get("database_specific") or {}).get("severity", "UNKNOWN")
+
+        # Add the extracted summary and severity label to the lists
+        texts.append(summary if isinstance(summary, str) else str(summary))
+        labels.append(severity_to_label(severity))
+    return texts, labels
+
+
+def advisory_matrix(vectorizer, data_list):
+    """The classifier input of a batch of advisory objects: TF-IDF of the summaries next to the CVSS columns."""
+    texts, _ = load_training_data(data_list)
+    return hstack([vectorizer.transform(texts), csr_matrix(advisory_features(data_list))]).tocsr()
+
+
+def save_classifier(path, vectorizer, model):
+    """Pickles the fitted vectorizer and model together (atomically)."""
+    artifact = {"version": MODEL_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "vectorizer": vectorizer, "model": model}
+    write_atomic(path, pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL), "wb")
+
+
+class SeverityClassifier:
+    """A fitted vectorizer and model, loaded once and reused for every batch."""
+
+    def __init__(self, vectorizer, model, created=None):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.created = created
+        self.labels = [LABEL_NAMES.get(int(label), str(label)) for label in model.classes_]
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with open(path, "rb") as f:
+            artifact = pickle.load(f)
+        if artifact.get("version") != MODEL_VERSION:
+            raise ValueError(f"{path} is a version {artifact.get('version')} model, expected {MODEL_VERSION}")
+        return cls(artifact["vectorizer"], artifact["model"], artifact.get("created"))
+
+    def score(self, data_list):
+        """Predicted severity and class probabilities of a batch of advisories, in the given order."""
+        data_list = usable_records(data_list)
+        if not data_list:
+            return []
+        with METRICS.stage("score_severity") as stage:
+            probabilities = self.model.predict_proba(advisory_matrix(self.vectorizer, data_list))
+            best = probabilities.argmax(axis=1).tolist()
+            results = [{"id": data.get("id"), "severity": self.labels[label],
+                        "probabilities": dict(zip(self.labels, row))}
+                       for data, label, row in zip(data_list, best, probabilities.round(6).tolist())]
+            stage.add(len(data_list))
+        return results
+
+    def score_all(self, data_list, batch_size=BATCH_SIZE):
+        results = []
+        for start in range(0, len(data_list), batch_size):
+            results.extend(self.score(data_list[start:start + batch_size]))
+        return results
+
+
+def read_jsonl(stream):
+    """Yields the advisories of a JSONL stream, logging and skipping lines that do not decode."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
         try:
-            print(f"Processing {json_file_path}...")
-
-            with open(json_file_path, 'r') as f:
-                data = json.load(f)
-
-            # Extract the relevant fields (e.g., summary and severity)
-            summary = data.get("summary", "")
-            severity = data.get("database_specific", {}).get("severity", "UNKNOWN")
-
-            # Convert severity to a numerical label (example: HIGH = 2, MEDIUM = 1, LOW = 0)
-            if isinstance(severity, str):
-                if severity.upper() == "HIGH":
-                    label = 2
-                elif severity.upper() == "MEDIUM":
-                    label = 1
-                elif severity.upper() == "LOW":
-                    label = 0
-                else:
-                    label = -1  # Unknown severity
-            else:
-                label = -1  # Unknown severity if it's not a string
-
-            # Add the extracted summary and severity label to the lists
-            texts.append(summary)
-            labels.append(label)
-
-        except Exception as e:
-            print(f"Error processing {json_file_path}: {e}")
+            yield loads(line)
+        except ValueError as e:
+            log.error("Skipping line %d: %s", number, e)
+
+
+def iter_records(source):
+    """Yields the advisories of a source as its files are parsed, logging the files that cannot be read."""
+    for path, record, error in iter_json_files(source, flatten=True, fields=SCORE_FIELDS):
+        if error is not None:
+            log.error("Error loading %s: %s", path, error)
+        else:
+            yield record
+
+
+def iter_batches(sources, batch_size=BATCH_SIZE, stdin=None):
+    """Yields batches of advisories from files, folders, zips or stores, and JSONL on stdin for "-"."""
+    batch = []
+    for source in sources:
+        if source == "-":
+            records = read_jsonl(stdin or sys.stdin.buffer)
+        else:
+            records = iter_records(source)
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def parse_request(body):
+    """Decodes a request body holding one advisory, a JSON array of them, or JSONL."""
+    try:
+        data = loads(body)
+    except ValueError:
+        data = [loads(line) for line in body.splitlines() if line.strip()]
+    data = data if isinstance(data, list) else [data]
+    if not all(isinstance(record, dict) for record in data):
+        raise ValueError("expected advisory objects")
+    return data
+
+
+def make_handler(classifier):
+    class ScoreHandler(BaseHTTPRequestHandler):
+        """POST /score with advisories (object, array or JSONL) returns their scores; GET /health."""
+
+        def do_GET(self):
+            if self.path != "/health":
+                self.respond(404, {"error": "not found"})
+                return
+            self.respond(200, {"status": "ok", "model_created": classifier.created, "labels": classifier.labels})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self.respond(404, {"error": "not found"})
+                return
+            try:
+                data_list = parse_request(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            except ValueError as e:
+                self.respond(400, {"error": str(e)})
+                return
+            try:
+                scores = classifier.score_all(data_list)
+            except Exception as e:
+                log.exception("Scoring a request of %d advisories failed", len(data_list))
+                self.respond(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self.respond(200, scores)
+
+        def respond(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(format, *args)
+
+    return ScoreHandler
+
+
+def serve(classifier, host="127.0.0.1", port=8000):
+    """Serves the classifier over HTTP until interrupted."""
+    server = ThreadingHTTPServer((host, port), make_handler(classifier))
+    log.info("Scoring advisories on http://%s:%d/score", host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def train(source, model_path=DEFAULT_MODEL_PATH):
+    """Fits, evaluates and saves the severity classifier."""
+    # Load all JSON files in the directory (or an advisory store built by advisorystore.py)
+    data_list, load_errors = load_json_files(source, fields="summary, database_specific.severity, severity")
+    for json_file_path, error in load_errors:
+        print(f"Error processing {json_file_path}: {error}")
+
+    # Check if we have any JSON files
+    if not data_list:
+        print("No JSON files found in the directory.")
+        return None
+    # Texts, labels and CVSS columns are all built from the same kept records, so their rows line up
+    data_list = usable_records(data_list)
+    texts, labels = load_training_data(data_list)
 
     # If we have enough data, proceed with the machine learning steps
-    if len(texts) > 0:
-        # Convert the text data into numerical features using TF-IDF
-        vectorizer = TfidfVectorizer(stop_words=nltk.corpus.stopwords.words('english'))
-        X = vectorizer.fit_transform(texts)
-        y = labels
+    if len(texts) == 0:
+        print("No valid data found for processing.")
+        return None
+
+    # Convert the text data into numerical features using TF-IDF, next to the CVSS metric columns
+    vectorizer = TfidfVectorizer(stop_words=nltk.corpus.stopwords.words('english'))
+    X = hstack([vectorizer.fit_transform(texts), csr_matrix(advisory_features(data_list))]).tocsr()
+    y = labels
+
+    # Split the data into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        # Split the data into training and testing sets
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Initialize the Logistic Regression model
+    model = LogisticRegression(max_iter=1000)
 
-        # Initialize the Logistic Regression model
-        model = LogisticRegression(max_iter=1000)
+    # Train the model
+    model.fit(X_train, y_train)
 
-        # Train the model
-        model.fit(X_train, y_train)
+    # Predict on the test set
+    y_pred = model.predict(X_test)
 
-        # Predict on the test set
-        y_pred = model.predict(X_test)
+    # Evaluate the model
+    print("\nModel Evaluation:")
+    print(classification_report(y_test, y_pred))
 
-        # Evaluate the model
-        print("\nModel Evaluation:")
-        print(classification_report(y_test, y_pred))
+    save_classifier(model_path, vectorizer, model)
+    print(f"Saved model to {model_path}")
+    classifier = SeverityClassifier(vectorizer, model)
 
-        # Predict the severity of a new vulnerability (example)
-        new_summary = "Keycloak's admin API allows low privilege users to use administrative functions"
-        new_summary_tfidf = vectorizer.transform([new_summary])
-        predicted_severity = model.predict(new_summary_tfidf)
+    # Predict the severity of a new vulnerability (example: GHSA-2cww-fgmg-4jqc)
+    new_advisory = {"summary": "Keycloak's admin API allows low privilege users to use administrative functions",
+                    "severity": [{"type": "CVSS_V3", "score": "CVSS:3.1/AV:N/AC:L/PR:L/UI:N/S:U/C:H/I:H/A:N"}]}
+    predicted_severity = classifier.score([new_advisory])[0]["severity"]
+    print(f"\nPredicted Severity for new vulnerability: {predicted_severity}")
+    return classifier
 
-        severity_labels = ["LOW", "MEDIUM", "HIGH"]
-        print(f"\nPredicted Severity for new vulnerability: {severity_labels[predicted_severity[0]]}")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the severity classifier, or score advisories with it.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Pickled vectorizer and model")
+    subparsers = parser.add_subparsers(dest="command")
+    train_parser = subparsers.add_parser("train", help="Fit, evaluate and save the classifier")
+    train_parser.add_argument("source", nargs="?", default=json_directory_path)
+    score_parser = subparsers.add_parser("score", help="Print JSONL scores of advisories")
+    score_parser.add_argument("sources", nargs="*", default=["-"],
+                              help='Files, folders, zips or stores; "-" (the default) reads JSONL from stdin')
+    score_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    serve_parser = subparsers.add_parser("serve", help="Score advisories posted to a local HTTP endpoint")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command in (None, "train"):
+        train(getattr(args, "source", json_directory_path), args.model)
+    elif args.command == "score":
+        classifier = SeverityClassifier.load(args.model)
+        start = time.perf_counter()
+        scored = 0
+        for batch in iter_batches(args.sources, args.batch_size):
+            for result in classifier.score(batch):
+                sys.stdout.write(json.dumps(result) + "\n")
+            scored += len(batch)
+        log.info("Scored %d advisories in %.2fs", scored, time.perf_counter() - start)
     else:
-        print("No valid data found for processing.")
+        serve(SeverityClassifier.load(args.model), args.host, args.port)
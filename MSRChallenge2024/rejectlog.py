@@ -0,0 +1,164 @@
+import json
+import os
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from metrics import METRICS
+
+DEFAULT_REJECT_LOG = "rejects.jsonl"
+# Records are handed to the writer thread in batches of this many
+DEFAULT_FLUSH_SIZE = 1000
+# Rotate once the log passes this size, keeping this many old files (rejects.jsonl.1, .2, ...)
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+# One encoder for every record instead of a new one per json.dumps call
+ENCODER = json.JSONEncoder(default=str)
+
+
+def record_key(entry_id, reason, source, details):
+    """Identity of a reject for deduplication: everything but the time it was written."""
+    if not details:
+        return entry_id, reason, source
+    return entry_id, reason, source, tuple(sorted((name, str(value)) for name, value in details.items()))
+
+
+def log_files(path, backups):
+    """Lists the log and its rotated backups, oldest first."""
+    candidates = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    return [candidate for candidate in candidates if os.path.exists(candidate)]
+
+
+def read_records(path, backups=DEFAULT_BACKUPS):
+    """Yields the records of a reject log and its backups (skipping lines that are not JSON)."""
+    for file_path in log_files(path, backups):
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+
+class RejectLog:
+    """Structured JSONL log of skipped entries, written in batches by a background thread.
+
+    add() only queues a tuple and bumps a per-reason counter; every flush_size
+    records the batch goes to the writer thread, which appends it with a single
+    write and rotates the file when it grows past max_bytes. Records already in
+    the log (or its backups) from an earlier run are counted but not written again.
+    """
+
+    def __init__(self, path=DEFAULT_REJECT_LOG, source=None, flush_size=DEFAULT_FLUSH_SIZE,
+                 max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, dedup=True):
+        self.path = path
+        self.source = source
+        self.flush_size = flush_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.counts = Counter()
+        self.duplicates = 0
+        self.seen = None
+        if dedup:
+            self.seen = set()
+            for record in read_records(path, backups):
+                details = {name: value for name, value in record.items()
+                           if name not in ("id", "reason", "source", "time")}
+                self.seen.add(record_key(record.get("id"), record.get("reason"), record.get("source"), details))
+        self.buffer = []
+        self.batches = queue.Queue()
+        self.error = None
+        self.writer = threading.Thread(target=self.write_batches, name="reject-log-writer", daemon=True)
+        self.writer.start()
+
+    def add(self, entry_id, reason, **details):
+        """Records one skipped entry; details become extra fields of the record."""
+        self.counts[reason] += 1
+        if self.seen is not None:
+            key = record_key(entry_id, reason, self.source, details)
+            if key in self.seen:
+                self.duplicates += 1
+                return
+            self.seen.add(key)
+        # Records are only turned into JSON by the writer thread
+        self.buffer.append((entry_id, reason, details))
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def extend(self, skipped_entries):
+        """Records a list of (id, reason) pairs."""
+        for entry_id, reason in skipped_entries:
+            self.add(entry_id, reason)
+
+    def flush(self):
+        """Hands the buffered records to the writer thread, stamped with the current time."""
+        if self.buffer:
+            self.batches.put((datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), self.buffer))
+            self.buffer = []
+
+    def write_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            timestamp, records = batch
+            lines = []
+            for entry_id, reason, details in records:
+                record = {"id": entry_id, "reason": reason}
+                if self.source:
+                    record["source"] = self.source
+                record.update(details)
+                record["time"] = timestamp
+                lines.append(ENCODER.encode(record))
+            try:
+                text = "\n".join(lines) + "\n"
+                self.rotate_if_needed(len(text.encode("utf-8")))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(text)
+            except OSError as e:
+                # Reported by close(); rejects must never take the analysis down
+                self.error = e
+
+    def rotate_if_needed(self, incoming):
+        if not self.max_bytes or not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) + incoming <= self.max_bytes:
+            return
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def close(self):
+        """Writes out everything still buffered and stops the writer thread."""
+        if self.writer.is_alive():
+            self.flush()
+            self.batches.put(None)
+            self.writer.join()
+            for reason, count in self.counts.items():
+                METRICS.count("records_rejected_total", count, reason=reason, source=self.source or "")
+        if self.error is not None:
+            print(f"Error writing reject log {self.path}: {self.error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """Per-reason counts, most frequent first, as printable lines."""
+        lines = [f"{count:>8}  {reason}" for reason, count in self.counts.most_common()]
+        if self.duplicates:
+            lines.append(f"({self.duplicates} already logged by an earlier run)")
+        return "\n".join(lines)
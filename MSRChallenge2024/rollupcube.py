@@ -0,0 +1,351 @@
+import argparse
+import io
+import math
+import os
+
+import numpy as np
+
+from loader import load_json_files
+from manifest import write_atomic
+from patchtime import (INVALID_PUBLISHED, NO_FIXED, NO_PUBLISHED, OK, PatchTimes, build_dynamic_mapping, first_fixed,
+                       from_records, merge_dynamic_mappings)
+from sharding import parse_shard
+
+# Dimensions of the cube, in storage order. "year" is derived from "month" at query time.
+DIMENSIONS = ["month", "severity", "cwe", "group_id"]
+# Advisory fields the cube reads
+CUBE_FIELDS = ("id, published, database_specific.severity, database_specific.cwe_ids, "
+               "affected.package.name, affected.ranges.events")
+
+
+def advisory_coordinates(entry):
+    """Returns the (severity, cwe, group_id) combinations an advisory falls into."""
+    database_specific = entry.get("database_specific") or {}
+    severity = database_specific.get("severity")
+    severity = severity.upper() if isinstance(severity, str) else ""
+    cwes = sorted(set(database_specific.get("cwe_ids") or [])) or [""]
+    groups = set()
+    for item in entry.get("affected") or []:
+        name = (item.get("package") or {}).get("name") or ""
+        groups.add(name.split(":")[0] if ":" in name else "")
+    return [(severity, cwe, group) for cwe in cwes for group in sorted(groups or [""])]
+
+
+class RollupCube:
+    """Weighted count, sum and sum of squares of patch times per month x severity x CWE x groupId cell.
+
+    An advisory with several CWEs or groupIds is split evenly over its cells, so
+    every advisory weighs 1 in any roll-up. The measures are additive: a roll-up is
+    an exact sum of cells, and an advisory can be taken back out of its cells when
+    a newer version of it comes in or its fixed version gets another date.
+    Dimension values are dictionary-encoded and the cells kept as parallel arrays.
+    """
+
+    def __init__(self, unit="minutes", max_patch_time=None, whole=False, resolver=None):
+        self.unit = unit
+        self.max_patch_time = max_patch_time
+        self.whole = whole  # Patch times floored to whole units, like timedelta.days
+        # Optional versiondates.VersionDateResolver; not saved, so pass the same one when loading
+        self.resolver = resolver
+        self.values = {name: [] for name in DIMENSIONS}  # code -> value
+        self.codes = {name: {} for name in DIMENSIONS}   # value -> code
+        self.cells = {}                                   # tuple of codes -> cell index
+        self.cell_codes = []
+        self.count = np.zeros(0, dtype=np.float64)
+        self.sum = np.zeros(0, dtype=np.float64)
+        self.sum_sq = np.zeros(0, dtype=np.float64)
+        # advisory id -> [cell indices, published, fixed version, patch time or None if not counted, package]
+        self.advisories = {}
+        self.by_fixed = {}                                # fixed version -> advisory ids
+        self.dynamic_mapping = {}                         # fixed version -> published, over every batch
+
+    def __len__(self):
+        return len(self.cell_codes)
+
+    def encode(self, name, value):
+        codes = self.codes[name]
+        if value not in codes:
+            codes[value] = len(self.values[name])
+            self.values[name].append(value)
+        return codes[value]
+
+    def cell(self, key):
+        """Returns the index of a cell, growing the measure arrays when it is new."""
+        index = self.cells.get(key)
+        if index is None:
+            index = self.cells[key] = len(self.cell_codes)
+            self.cell_codes.append(key)
+            if index >= len(self.count):
+                size = max(16, 2 * len(self.count))
+                self.count = np.resize(self.count, size)
+                self.sum = np.resize(self.sum, size)
+                self.sum_sq = np.resize(self.sum_sq, size)
+                self.count[index:] = 0
+                self.sum[index:] = 0
+                self.sum_sq[index:] = 0
+        return index
+
+    def apply(self, cells, value, sign):
+        """Adds (sign=1) or takes back (sign=-1) one patch time, split evenly over its cells."""
+        weight = sign / len(cells)
+        for index in cells:
+            self.count[index] += weight
+            self.sum[index] += weight * value
+            self.sum_sq[index] += weight * value * value
+
+    def forget(self, advisory):
+        record = self.advisories.pop(advisory, None)
+        if record is not None:
+            if record[3] is not None:
+                self.apply(record[0], record[3], -1)
+            self.by_fixed[record[2]].discard(advisory)
+
+    def update(self, data_list):
+        """Adds a batch of advisories, replacing earlier versions of the same ids.
+
+        Fixed versions are dated with the mapping of every batch seen so far (the
+        earliest advisory fixing a version wins, as in build_dynamic_mapping). Only the
+        cells of the batch and of earlier advisories whose fixed version got a new
+        date are touched, so adding batches one by one gives the same cube as adding
+        them all at once. Returns the skipped (id, reason) entries of the batch.
+        """
+        redated = merge_dynamic_mappings(self.dynamic_mapping, build_dynamic_mapping(data_list))
+
+        patch_times = from_records(data_list, self.dynamic_mapping, resolver=self.resolver)
+        _, status = patch_times.evaluate(self.unit, self.max_patch_time, self.whole)
+        for i, entry in enumerate(data_list):
+            advisory = entry.get("id")
+            self.forget(advisory)
+            # Only advisories whose status can still change with the mapping are kept
+            if status[i] in (NO_PUBLISHED, NO_FIXED, INVALID_PUBLISHED):
+                continue
+            month = self.encode("month", str(patch_times.published[i].astype("datetime64[M]")))
+            cells = tuple(self.cell((month, self.encode("severity", severity), self.encode("cwe", cwe),
+                                     self.encode("group_id", group)))
+                          for severity, cwe, group in advisory_coordinates(entry))
+            fixed = patch_times.fixed_versions[i]
+            package = first_fixed(entry)[0] or ""
+            self.advisories[advisory] = [cells, entry.get("published"), fixed, None, package]
+            self.by_fixed.setdefault(fixed, set()).add(advisory)
+
+        batch_ids = [entry.get("id") for entry in data_list]
+        affected = {advisory for advisory in batch_ids if advisory in self.advisories}
+        for version in redated:
+            affected.update(self.by_fixed.get(version, ()))
+        self.evaluate(sorted(affected))
+        return patch_times.skipped_entries(status)
+
+    def evaluate(self, advisories):
+        """Recomputes the patch times of some stored advisories and moves them between cells."""
+        if not advisories:
+            return
+        records = [self.advisories[advisory] for advisory in advisories]
+        patch_times = PatchTimes(advisories, [record[1] for record in records], [record[2] for record in records],
+                                 self.dynamic_mapping, packages=[record[4] for record in records],
+                                 resolver=self.resolver)
+        durations = patch_times.durations(self.unit)
+        if self.whole:
+            durations = np.floor(durations)
+        _, status = patch_times.evaluate(self.unit, self.max_patch_time, self.whole)
+        for record, value, record_status in zip(records, durations.tolist(), status):
+            if record[3] is not None:
+                self.apply(record[0], record[3], -1)
+            record[3] = value if record_status == OK else None
+            if record[3] is not None:
+                self.apply(record[0], record[3], 1)
+
+    def merge(self, other):
+        """Adds the advisories of another cube built with the same settings, e.g. another shard's.
+
+        The dynamic mappings are merged (earliest date wins), so the other cube's
+        advisories and every stored advisory whose fixed version got an earlier
+        date are re-evaluated: merging the cubes of all shards gives the cube of
+        one unsharded run. An advisory in both cubes keeps the other cube's copy.
+        Returns the ids whose patch time may differ from the one in their own cube.
+        """
+        if (other.unit, other.max_patch_time, other.whole) != (self.unit, self.max_patch_time, self.whole):
+            raise ValueError(f"Cannot merge a cube in {other.unit} (max {other.max_patch_time}, whole={other.whole}) "
+                             f"into one in {self.unit} (max {self.max_patch_time}, whole={self.whole})")
+        previous = set(self.advisories)
+        redated = merge_dynamic_mappings(self.dynamic_mapping, other.dynamic_mapping)
+        # Versions the other cube dated later than this one did
+        other_redated = {version for version, published in other.dynamic_mapping.items()
+                         if self.dynamic_mapping[version] != published}
+        for advisory, (cells, published, fixed, _, package) in other.advisories.items():
+            self.forget(advisory)
+            cells = tuple(self.cell(tuple(self.encode(name, other.values[name][code])
+                                          for name, code in zip(DIMENSIONS, other.cell_codes[index])))
+                          for index in cells)
+            self.advisories[advisory] = [cells, published, fixed, None, package]
+            self.by_fixed.setdefault(fixed, set()).add(advisory)
+        affected = set(other.advisories)
+        for version in redated:
+            affected.update(self.by_fixed.get(version, ()))
+        self.evaluate(sorted(affected))
+        return (affected & previous) | {advisory for advisory, record in other.advisories.items()
+                                        if record[2] in other_redated}
+
+    def patch_times(self):
+        """The patch times of the counted advisories, in advisory id order."""
+        return np.array([self.advisories[advisory][3] for advisory in sorted(self.advisories)
+                         if self.advisories[advisory][3] is not None], dtype=np.float64)
+
+    def code_array(self, name):
+        """Returns the codes of one dimension for every cell ("year" is derived from "month")."""
+        n = len(self.cell_codes)
+        if name == "year":
+            years = np.array([int(month[:4]) for month in self.values["month"]], dtype=np.int32)
+            return years[self.code_array("month")] if n else np.zeros(0, dtype=np.int32)
+        column = DIMENSIONS.index(name)
+        return np.fromiter((key[column] for key in self.cell_codes), dtype=np.int32, count=n)
+
+    def decode(self, name, code):
+        return int(code) if name == "year" else self.values[name][code]
+
+    def query(self, by=(), **filters):
+        """Rolls the cube up to the dimensions in `by`, keeping only the cells matching `filters`.
+
+        Filters take a value or a collection of values per dimension; month values
+        also match as a prefix ("2023" selects every month of 2023). Returns
+        {tuple of `by` values: {"count", "mean", "std", "sum"}}.
+        """
+        n = len(self.cell_codes)
+        # Removing an advisory can leave float dust in an emptied cell
+        mask = self.count[:n] > 1e-9
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            if isinstance(wanted, (str, int)):
+                wanted = [wanted]
+            if name == "year":
+                mask &= np.isin(self.code_array("year"), [int(year) for year in wanted])
+                continue
+            wanted = [str(value) for value in wanted]
+            matching = [code for code, value in enumerate(self.values[name])
+                        if value in wanted or (name == "month" and any(value.startswith(w) for w in wanted))]
+            mask &= np.isin(self.code_array(name), matching)
+
+        selected = np.flatnonzero(mask)
+        if by:
+            keys = np.stack([self.code_array(name)[selected] for name in by], axis=1)
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        else:
+            groups, inverse = np.zeros((1, 0), dtype=np.int32), np.zeros(len(selected), dtype=np.int64)
+        inverse = inverse.reshape(-1)
+        count = np.bincount(inverse, self.count[selected], minlength=len(groups))
+        total = np.bincount(inverse, self.sum[selected], minlength=len(groups))
+        total_sq = np.bincount(inverse, self.sum_sq[selected], minlength=len(groups))
+
+        result = {}
+        for g, key in enumerate(groups):
+            if count[g] <= 1e-9:
+                continue
+            mean = total[g] / count[g]
+            variance = (total_sq[g] - count[g] * mean * mean) / (count[g] - 1) if count[g] > 1 else 0.0
+            result[tuple(self.decode(name, code) for name, code in zip(by, key))] = {
+                "count": float(count[g]), "mean": float(mean), "std": math.sqrt(max(variance, 0.0)),
+                "sum": float(total[g])}
+        return result
+
+    def save(self, path):
+        """Writes the cube to a single compressed .npz file (atomically)."""
+        n = len(self.cell_codes)
+        ids = list(self.advisories)
+        records = [self.advisories[advisory] for advisory in ids]
+        arrays = {
+            "unit": np.array(self.unit),
+            "max_patch_time": np.array(np.nan if self.max_patch_time is None else self.max_patch_time),
+            "whole": np.array(self.whole),
+            "cell_codes": np.array(self.cell_codes, dtype=np.int32).reshape(n, len(DIMENSIONS)),
+            "count": self.count[:n], "sum": self.sum[:n], "sum_sq": self.sum_sq[:n],
+            "advisory_ids": np.array(ids, dtype=str),
+            "advisory_published": np.array([record[1] for record in records], dtype=str),
+            "advisory_fixed": np.array([record[2] for record in records], dtype=str),
+            "advisory_packages": np.array([record[4] for record in records], dtype=str),
+            "advisory_values": np.array([np.nan if record[3] is None else record[3] for record in records],
+                                        dtype=np.float64),
+            "advisory_offsets": np.cumsum([0] + [len(record[0]) for record in records]).astype(np.int64),
+            "advisory_cells": np.array([i for record in records for i in record[0]], dtype=np.int64),
+            "mapping_versions": np.array(list(self.dynamic_mapping), dtype=str),
+            "mapping_dates": np.array(list(self.dynamic_mapping.values()), dtype=str),
+        }
+        for name in DIMENSIONS:
+            arrays["values_" + name] = np.array(self.values[name], dtype=str)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        write_atomic(path, buffer.getvalue(), "wb")
+
+    @classmethod
+    def load(cls, path, resolver=None):
+        with np.load(path, allow_pickle=False) as arrays:
+            max_patch_time = float(arrays["max_patch_time"])
+            # Cubes saved before whole and the packages were kept have neither
+            whole = bool(arrays["whole"]) if "whole" in arrays.files else False
+            cube = cls(str(arrays["unit"]), None if math.isnan(max_patch_time) else max_patch_time, whole, resolver)
+            for name in DIMENSIONS:
+                cube.values[name] = arrays["values_" + name].tolist()
+                cube.codes[name] = {value: code for code, value in enumerate(cube.values[name])}
+            cube.cell_codes = [tuple(key) for key in arrays["cell_codes"].tolist()]
+            cube.cells = {key: index for index, key in enumerate(cube.cell_codes)}
+            cube.count = arrays["count"].copy()
+            cube.sum = arrays["sum"].copy()
+            cube.sum_sq = arrays["sum_sq"].copy()
+            offsets = arrays["advisory_offsets"].tolist()
+            cells = arrays["advisory_cells"].tolist()
+            ids = arrays["advisory_ids"].tolist()
+            packages = arrays["advisory_packages"].tolist() if "advisory_packages" in arrays.files else [""] * len(ids)
+            columns = zip(ids, arrays["advisory_published"].tolist(), arrays["advisory_fixed"].tolist(),
+                          arrays["advisory_values"].tolist(), packages)
+            for i, (advisory, published, fixed, value, package) in enumerate(columns):
+                value = None if math.isnan(value) else value
+                cube.advisories[advisory] = [tuple(cells[offsets[i]:offsets[i + 1]]), published, fixed, value, package]
+                cube.by_fixed.setdefault(fixed, set()).add(advisory)
+            cube.dynamic_mapping = dict(zip(arrays["mapping_versions"].tolist(), arrays["mapping_dates"].tolist()))
+        return cube
+
+
+def build_cube(source, cube_path=None, unit="minutes", max_patch_time=None, workers=None, shard=None):
+    """Loads a dataset (or its hash shard (i, N)) and adds it to the cube at cube_path (created if missing)."""
+    if cube_path and os.path.exists(cube_path):
+        cube = RollupCube.load(cube_path)
+    else:
+        cube = RollupCube(unit, max_patch_time)
+    data_list, load_errors = load_json_files(source, workers=workers, flatten=True, fields=CUBE_FIELDS, shard=shard)
+    skipped_entries = cube.update(data_list)
+    if cube_path:
+        cube.save(cube_path)
+    return cube, load_errors, skipped_entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the patch-time rollup cube.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Add a dataset to the cube")
+    build_parser.add_argument("source", help="Folder, glob, zip or advisory store")
+    build_parser.add_argument("cube", help="Cube file (.npz)")
+    build_parser.add_argument("--max-patch-time", type=float, default=None)
+    build_parser.add_argument("--shard", type=parse_shard, default=None,
+                              help="only add shard i of N (e.g. 0/4), split by advisory id")
+    query_parser = subparsers.add_parser("query", help="Roll the cube up along some dimensions")
+    query_parser.add_argument("cube", help="Cube file (.npz)")
+    query_parser.add_argument("--by", default="", help="Comma-separated dimensions, e.g. year,severity")
+    for name in DIMENSIONS + ["year"]:
+        query_parser.add_argument("--" + name.replace("_", "-"), dest=name, action="append")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        cube, load_errors, skipped_entries = build_cube(args.source, args.cube, max_patch_time=args.max_patch_time,
+                                                           shard=args.shard)
+        for file, error in load_errors:
+            print(f"Error loading file {file}: {error}")
+        counted = sum(1 for record in cube.advisories.values() if record[3] is not None)
+        print(f"Cube has {len(cube)} cells from {counted} advisories "
+              f"({len(skipped_entries)} skipped)")
+    else:
+        cube = RollupCube.load(args.cube)
+        by = [name.strip() for name in args.by.split(",") if name.strip()]
+        filters = {name: getattr(args, name) for name in DIMENSIONS + ["year"]}
+        for key, measures in sorted(cube.query(by, **filters).items()):
+            label = ", ".join(str(value) or "-" for value in key) or "all"
+            print(f"{label}: n={measures['count']:g} mean={measures['mean']:.2f} "
+                  f"std={measures['std']:.2f} {cube.unit}")
@@ -0,0 +1,140 @@
+import hashlib
+import heapq
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from loader import ZIP_MEMBER_SEPARATOR, file_size
+
+
+def estimate_cost(path):
+    """Estimates the cost of processing a file by its size in bytes (zip members included)."""
+    return file_size(path)
+
+
+def partition_by_cost(paths, num_shards, cost=estimate_cost):
+    """Splits paths into num_shards lists of nearly equal total cost.
+
+    Largest files are placed first, each on the currently cheapest shard (LPT
+    scheduling), which keeps every shard within one file of the average. Ties
+    are broken by name and each shard is returned sorted, so the split is
+    reproducible.
+    """
+    costs = sorted(((cost(path), path) for path in paths), key=lambda item: (-item[0], item[1]))
+    shards = [[] for _ in range(num_shards)]
+    heap = [(0, i) for i in range(num_shards)]
+    for file_cost, path in costs:
+        total, i = heapq.heappop(heap)
+        shards[i].append(path)
+        heapq.heappush(heap, (total + file_cost, i))
+    return [sorted(shard) for shard in shards]
+
+
+def make_batches(paths, target_cost, cost=estimate_cost, max_files=None):
+    """Groups paths (in order) into batches of roughly target_cost each, and at most max_files paths."""
+    batches = []
+    batch, batch_cost = [], 0
+    for path in paths:
+        batch.append(path)
+        batch_cost += cost(path)
+        if batch_cost >= target_cost or len(batch) == max_files:
+            batches.append((batch_cost, batch))
+            batch, batch_cost = [], 0
+    if batch:
+        batches.append((batch_cost, batch))
+    return batches
+
+
+def run_work_stealing(paths, func, workers=None, batches_per_worker=8, cost=estimate_cost, max_batch_files=None):
+    """Runs func(list of paths) -> list of results over a process pool with dynamic load balancing.
+
+    The work is cut into many small batches of similar cost and workers pull the
+    next batch as soon as they finish one, most expensive first, so a worker that
+    drew cheap files simply takes more batches. max_batch_files also caps the
+    number of files in a batch, so many tiny files do not end up in one batch.
+    Results come back in path order.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    total_cost = sum(cost(path) for path in paths)
+    target_cost = max(1, total_cost // (workers * batches_per_worker))
+    batches = make_batches(paths, target_cost, cost, max_batch_files)
+
+    # Expensive batches go first so the last batches to finish are small ones
+    order = sorted(range(len(batches)), key=lambda i: -batches[i][0])
+    results = [None] * len(batches)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep only a couple of batches queued per worker; the rest are handed out as workers free up
+        queue = iter(order)
+        running = {}
+        for i in queue:
+            running[pool.submit(func, batches[i][1])] = i
+            if len(running) >= workers * 2:
+                break
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+                next_index = next(queue, None)
+                if next_index is not None:
+                    running[pool.submit(func, batches[next_index][1])] = next_index
+    return [result for batch_results in results for result in batch_results]
+
+
+def advisory_id(path):
+    """Returns the advisory id of a file: its name without .json (OSV files are named after their id)."""
+    name = os.path.basename(path.split(ZIP_MEMBER_SEPARATOR)[-1])
+    return name[:-5] if name.endswith(".json") else name
+
+
+def jump_hash(key, num_buckets):
+    """Jump consistent hash (Lamping & Veach): maps a 64-bit key to one of num_buckets.
+
+    Growing num_buckets from N to N+1 only moves 1/(N+1) of the keys.
+    """
+    bucket, j = -1, 0
+    while j < num_buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(advisory, num_shards):
+    """Returns the shard an advisory id belongs to.
+
+    The assignment only depends on the id and the shard count, so it is the same
+    on every machine and adding advisories never moves existing ones.
+    """
+    key = int.from_bytes(hashlib.sha1(advisory.encode("utf-8")).digest()[:8], "big")
+    return jump_hash(key, num_shards)
+
+
+def parse_shard(text):
+    """Parses a "i/N" shard spec (0 <= i < N) into (i, N)."""
+    index, num_shards = (int(part) for part in text.split("/"))
+    if not 0 <= index < num_shards:
+        raise ValueError(f"Invalid shard {text}: expected i/N with 0 <= i < N")
+    return index, num_shards
+
+
+def select_shard(paths, shard):
+    """Keeps the paths whose advisory falls in shard (i, N)."""
+    index, num_shards = shard
+    return [path for path in paths if shard_of(advisory_id(path), num_shards) == index]
+
+
+def distribute_files(source_folder, target_folders):
+    """Moves the files of source_folder into target_folders, balancing their total size."""
+    files = sorted(os.path.join(source_folder, name) for name in os.listdir(source_folder))
+    files = [path for path in files if os.path.isfile(path)]
+
+    # Ensure the target folders exist
+    for folder in target_folders:
+        os.makedirs(folder, exist_ok=True)
+
+    for folder, shard in zip(target_folders, partition_by_cost(files, len(target_folders))):
+        for source_path in shard:
+            shutil.move(source_path, os.path.join(folder, os.path.basename(source_path)))
+        shard_size = sum(os.path.getsize(os.path.join(folder, os.path.basename(path))) for path in shard)
+        print(f"{folder} received {len(shard)} files ({shard_size} bytes).")
@@ -0,0 +1,120 @@
+import argparse
+import glob
+import json
+import re
+
+from manifest import write_atomic
+from rollupcube import RollupCube
+from sharding import parse_shard
+from streamstats import PatchTimeStats, format_summary, merge_all
+from versiondates import add_resolver_arguments, resolver_from_args
+
+# Version of the per-shard statistics files
+SHARD_FORMAT = 1
+SHARD_NAME = re.compile(r"-(\d+)of(\d+)\.json$")
+
+
+def shard_path(prefix, shard, suffix):
+    """The file a shard (i, N) of a run writes its output to, e.g. jaydentime-shard-0of4.json."""
+    index, num_shards = shard
+    return f"{prefix}-{index}of{num_shards}{suffix}"
+
+
+def add_shard_arguments(parser, default_output):
+    """Adds --shard and --shard-output, where a sharded run of a patch-time script writes its results."""
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="only read shard i of N (e.g. 0/4), split by advisory id")
+    parser.add_argument("--shard-output", default=default_output,
+                        help="prefix of the stats (.json) and cube (.npz) files written with --shard; "
+                             "combine them with shardmerge.py")
+
+
+def write_shard(prefix, shard, data_list, stats, unit, max_patch_time=None, whole=False, exclude_zero=False,
+                resolver=None):
+    """Writes a shard's PatchTimeStats and a rollup cube of its advisories, for merge_shards.
+
+    The statistics alone cannot be merged exactly: a fixed version is dated by the
+    earliest advisory fixing it, which may be in another shard. The cube keeps every
+    advisory's published date and fixed version so the merge can redate them.
+    """
+    cube = RollupCube(unit, max_patch_time, whole, resolver)
+    cube.update(data_list)
+    cube.save(shard_path(prefix, shard, ".npz"))
+    state = {"version": SHARD_FORMAT, "shard": list(shard), "unit": unit, "max_patch_time": max_patch_time,
+             "whole": whole, "exclude_zero": exclude_zero, "stats": stats.to_dict()}
+    write_atomic(shard_path(prefix, shard, ".json"), json.dumps(state, indent=2), "w")
+
+
+def find_shards(prefix):
+    """Returns the stats files of shards 0..N-1 of a run, raising ValueError if any is missing."""
+    found = {}
+    for path in glob.glob(glob.escape(prefix) + "-*of*.json"):
+        match = SHARD_NAME.search(path[len(prefix):])
+        if match:
+            found[int(match.group(1)), int(match.group(2))] = path
+    counts = {num_shards for _, num_shards in found}
+    if len(counts) != 1:
+        raise ValueError(f"Expected the shards of one run under {prefix}, found counts {sorted(counts) or 'none'}")
+    num_shards = counts.pop()
+    missing = [i for i in range(num_shards) if (i, num_shards) not in found]
+    if missing:
+        raise ValueError(f"Missing shards {missing} of {num_shards} under {prefix}")
+    return [found[i, num_shards] for i in range(num_shards)]
+
+
+def merge_shards(prefix, resolver=None):
+    """Merges the outputs of every shard of a run into (cube, stats, settings) of one unsharded run.
+
+    The shards' statistics are merged as they are when no shard changed the patch
+    times of another; otherwise they are rebuilt from the merged cube.
+    """
+    cube, partials, settings, changed = None, [], None, False
+    for path in find_shards(prefix):
+        with open(path) as f:
+            state = json.load(f)
+        shard_settings = {key: state[key] for key in ("unit", "max_patch_time", "whole", "exclude_zero")}
+        if settings is None:
+            settings = shard_settings
+        elif shard_settings != settings:
+            raise ValueError(f"Shard {path} was run with {shard_settings}, the others with {settings}")
+        partials.append(PatchTimeStats.from_dict(state["stats"]))
+        other = RollupCube.load(path[:-len(".json")] + ".npz", resolver)
+        if cube is None:
+            cube = other
+        elif cube.merge(other):
+            changed = True
+
+    if not changed:
+        return cube, merge_all(partials), settings
+    values = cube.patch_times()
+    if settings["exclude_zero"]:
+        values = values[values > 0]
+    stats = PatchTimeStats()
+    stats.update(values)
+    return cube, stats, settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the per-shard results of a patch-time script run with "
+                                                 "--shard.")
+    parser.add_argument("prefix", help="--shard-output prefix of the run, e.g. jaydentime-shard")
+    parser.add_argument("--cube", default=None, help="Also save the merged rollup cube (.npz) here")
+    add_resolver_arguments(parser)
+    args = parser.parse_args()
+    # The shards must be merged with the release data they were run with
+    resolver = resolver_from_args(args)
+
+    try:
+        cube, stats, settings = merge_shards(args.prefix, resolver)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.cube:
+        cube.save(args.cube)
+
+    unit = settings["unit"]
+    if stats.count:
+        summary = stats.summary()
+        print(f"Average Patch Time: {summary['mean']:.2f} {unit}")
+        print(f"Distribution: {format_summary(summary, unit)}")
+    else:
+        print("No valid patch times found.")
@@ -0,0 +1,303 @@
+import math
+
+import numpy as np
+
+# Relative error of the quantile sketch: any reported quantile is within 1% of a
+# value that really is at that rank
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Bucket budget of the sketch; past it the lowest buckets are folded together,
+# which only costs accuracy on the smallest quantiles
+DEFAULT_MAX_BUCKETS = 2048
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RunningStats:
+    """Count, mean, variance, min and max in constant memory (Welford, merged with Chan et al.)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update(self, values):
+        """Adds a whole array of values at once."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            other = RunningStats()
+            other.count = len(values)
+            other.mean = float(values.mean())
+            other.m2 = float(((values - other.mean) ** 2).sum())
+            other.min = float(values.min())
+            other.max = float(values.max())
+            self.merge(other)
+
+    def merge(self, other):
+        """Folds in the stats of another partition; the result is exact."""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Sample variance (0 below two values)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.count, stats.mean, stats.m2 = state["count"], state["mean"], state["m2"]
+        if stats.count:
+            stats.min, stats.max = state["min"], state["max"]
+        return stats
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Positive values fall in logarithmic buckets of ratio gamma, so every bucket
+    spans values within relative_accuracy of its midpoint, whatever their scale.
+    Negative values (a fixed date before the published one) get a mirrored set of
+    buckets. Two sketches with the same accuracy merge exactly by adding counts.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def bucket(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def bucket_value(self, index):
+        """Returns the representative value of a bucket (within relative_accuracy of its contents)."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if value > 0:
+            index = self.bucket(value)
+            self.positive[index] = self.positive.get(index, 0) + count
+        elif value < 0:
+            index = self.bucket(-value)
+            self.negative[index] = self.negative.get(index, 0) + count
+        else:
+            self.zeros += count
+        self.count += count
+        self.collapse()
+
+    def update(self, values):
+        """Adds a whole array of values, bucketing them in one vectorized pass."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        for store, selected in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            if len(selected):
+                indices, counts = np.unique(np.ceil(np.log(selected) / self.log_gamma).astype(np.int64),
+                                            return_counts=True)
+                for index, count in zip(indices.tolist(), counts.tolist()):
+                    store[index] = store.get(index, 0) + count
+        self.zeros += int((values == 0).sum())
+        self.count += len(values)
+        self.collapse()
+
+    def merge(self, other):
+        """Adds another sketch's buckets into this one."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge quantile sketches with different relative accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.collapse()
+
+    def collapse(self):
+        """Folds the lowest-magnitude buckets together to stay within max_buckets."""
+        for store in (self.positive, self.negative):
+            if len(store) > self.max_buckets:
+                indices = sorted(store)
+                excess = indices[:len(indices) - self.max_buckets + 1]
+                folded = sum(store.pop(index) for index in excess)
+                store[excess[-1]] = folded
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile (0 <= q <= 1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Walk from the most negative value upwards
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self.bucket_value(index)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self):
+        # JSON object keys must be strings
+        return {"relative_accuracy": self.relative_accuracy, "max_buckets": self.max_buckets,
+                "positive": {str(k): v for k, v in self.positive.items()},
+                "negative": {str(k): v for k, v in self.negative.items()},
+                "zeros": self.zeros, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["relative_accuracy"], state["max_buckets"])
+        sketch.positive = {int(k): v for k, v in state["positive"].items()}
+        sketch.negative = {int(k): v for k, v in state["negative"].items()}
+        sketch.zeros, sketch.count = state["zeros"], state["count"]
+        return sketch
+
+
+class LogHistogram:
+    """Exact counts per power-of-base bucket: [base^k, base^(k+1)), with zero and negatives kept apart."""
+
+    def __init__(self, base=2):
+        self.base = base
+        self.buckets = {}
+        self.zeros = 0
+        self.negatives = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        if len(positive):
+            # floor(log) can land one bucket off at exact powers, so fix those up
+            exponents = np.floor(np.log(positive) / math.log(self.base)).astype(np.int64)
+            exponents[self.base ** (exponents + 1.0) <= positive] += 1
+            exponents[self.base ** exponents.astype(np.float64) > positive] -= 1
+            indices, counts = np.unique(exponents, return_counts=True)
+            for index, count in zip(indices.tolist(), counts.tolist()):
+                self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += int((values == 0).sum())
+        self.negatives += int((values < 0).sum())
+
+    def add(self, value):
+        self.update([value])
+
+    def merge(self, other):
+        if other.base != self.base:
+            raise ValueError("Cannot merge histograms with different bases")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.negatives += other.negatives
+
+    def bins(self):
+        """Lists (low, high, count) for every non-empty positive bucket in increasing order."""
+        return [(self.base ** index, self.base ** (index + 1), self.buckets[index]) for index in sorted(self.buckets)]
+
+    def to_dict(self):
+        return {"base": self.base, "buckets": {str(k): v for k, v in self.buckets.items()},
+                "zeros": self.zeros, "negatives": self.negatives}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = cls(state["base"])
+        histogram.buckets = {int(k): v for k, v in state["buckets"].items()}
+        histogram.zeros, histogram.negatives = state["zeros"], state["negatives"]
+        return histogram
+
+
+class PatchTimeStats:
+    """Moments, quantiles and a log histogram of a stream of patch times, all mergeable."""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, base=2):
+        self.moments = RunningStats()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.histogram = LogHistogram(base)
+
+    def add(self, value):
+        self.moments.add(value)
+        self.sketch.add(value)
+        self.histogram.add(value)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.moments.update(values)
+        self.sketch.update(values)
+        self.histogram.update(values)
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """Returns the headline numbers as a flat dict (mean, std, min, max, p50, p90, p99, ...)."""
+        if not self.count:
+            return {"count": 0}
+        summary = {"count": self.count, "mean": self.moments.mean, "std": self.moments.std,
+                   "min": self.moments.min, "max": self.moments.max}
+        for q in quantiles:
+            summary[f"p{q * 100:g}"] = self.sketch.quantile(q)
+        return summary
+
+    def to_dict(self):
+        return {"moments": self.moments.to_dict(), "sketch": self.sketch.to_dict(),
+                "histogram": self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.moments = RunningStats.from_dict(state["moments"])
+        stats.sketch = QuantileSketch.from_dict(state["sketch"])
+        stats.histogram = LogHistogram.from_dict(state["histogram"])
+        return stats
+
+
+def merge_all(partials):
+    """Combines per-shard or per-process PatchTimeStats into one."""
+    total = PatchTimeStats()
+    for partial in partials:
+        total.merge(partial)
+    return total
+
+
+def format_summary(summary, unit):
+    """One-line rendering of PatchTimeStats.summary() for the scripts' output."""
+    if not summary["count"]:
+        return "no values"
+    parts = [f"{name}={value:.2f}" for name, value in summary.items() if name != "count" and value is not None]
+    return f"n={summary['count']} " + " ".join(parts) + f" ({unit})"
@@ -0,0 +1,193 @@
+import argparse
+import csv
+import io
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import MinMaxScaler
+
+from LSTM import build_lstm_model, create_sequences, extract_patch_times, load_data, window_dataset
+from manifest import write_atomic
+
+# Hyperparameters searched by default; units lists the LSTM layer sizes from input to output
+DEFAULT_GRID = {
+    "sequence_length": [5, 10, 20],
+    "units": [(64, 32), (32, 16), (64,)],
+    "dropout": [0.1, 0.2],
+    "epochs": [50],
+    "batch_size": [16, 64],
+}
+# Epochs without a better validation loss before a run is stopped
+DEFAULT_PATIENCE = 5
+# Sequences (in time order) trained on and early-stopped on; the rest are the held-out test
+# slice the configs are scored and ranked on
+TRAIN_FRACTION = 0.7
+VAL_FRACTION = 0.15
+TABLE_COLUMNS = ["rank", "sequence_length", "units", "dropout", "epochs", "batch_size", "epochs_run",
+                 "val_loss", "mae", "rmse", "seconds", "status", "reason"]
+
+# Data and settings of this worker process, set once by init_worker instead of sent with every config
+WORKER = {}
+
+
+def grid_configs(grid):
+    """Every combination of the grid's values, as a list of config dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configs(grid, samples, seed=0):
+    """samples distinct combinations of the grid's values drawn at random."""
+    configs = grid_configs(grid)
+    return random.Random(seed).sample(configs, min(samples, len(configs)))
+
+
+def init_worker(features, patch_times, threads, patience, seed):
+    """Runs once per worker: bounds TensorFlow's thread pools before any op starts them."""
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    WORKER.update(features=features, patch_times=patch_times, patience=patience, seed=seed)
+
+
+def evaluate_config(config):
+    """Trains one configuration and returns its result row.
+
+    The validation slice only drives early stopping; mae and rmse are measured on
+    the held-out test slice after it, which the run never saw.
+    """
+    result = dict(config)
+    start = time.perf_counter()
+    try:
+        tf.keras.utils.set_random_seed(WORKER["seed"])
+        feature_scaler = MinMaxScaler()
+        target_scaler = MinMaxScaler()
+        X, y = create_sequences(feature_scaler.fit_transform(WORKER["features"]),
+                                target_scaler.fit_transform(WORKER["patch_times"].reshape(-1, 1)),
+                                config["sequence_length"])
+        train_end = int(TRAIN_FRACTION * len(X))
+        val_end = int((TRAIN_FRACTION + VAL_FRACTION) * len(X))
+        if train_end == 0 or val_end == train_end or val_end == len(X):
+            result.update(status="skipped", reason=f"only {len(X)} sequences")
+            return result
+        train_data = window_dataset(X[:train_end], y[:train_end], config["batch_size"], shuffle=True,
+                                    seed=WORKER["seed"])
+        val_data = window_dataset(X[train_end:val_end], y[train_end:val_end], config["batch_size"])
+        test_data = window_dataset(X[val_end:], y[val_end:], config["batch_size"])
+
+        model = build_lstm_model((X.shape[1], X.shape[2]), config["units"], config["dropout"])
+        stopper = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=WORKER["patience"],
+                                                   restore_best_weights=True)
+        history = model.fit(train_data, validation_data=val_data, epochs=config["epochs"], callbacks=[stopper],
+                            verbose=0)
+
+        predictions = target_scaler.inverse_transform(model.predict(test_data, verbose=0))
+        errors = predictions - target_scaler.inverse_transform(y[val_end:].reshape(-1, 1))
+        result.update(status="ok", epochs_run=len(history.history["loss"]),
+                      val_loss=float(min(history.history["val_loss"])),
+                      mae=float(np.mean(np.abs(errors))), rmse=float(np.sqrt(np.mean(errors ** 2))))
+    except Exception as e:
+        result.update(status="error", reason=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_sweep(features, patch_times, configs, workers=None, threads=None, patience=DEFAULT_PATIENCE, seed=0):
+    """Evaluates the configs over a process pool and returns the results ranked by held-out test RMSE.
+
+    Each worker gets threads TensorFlow threads (by default the CPUs split
+    evenly), so the workers do not oversubscribe the machine.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(configs)) or 1
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    initargs = (features, patch_times, threads, patience, seed)
+    results = []
+    if workers == 1:
+        init_worker(*initargs)
+        for config in configs:
+            results.append(evaluate_config(config))
+            print(format_result(results[-1]))
+    else:
+        # TensorFlow is not fork-safe, so the workers are started fresh
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker, initargs=initargs) as pool:
+            for future in as_completed([pool.submit(evaluate_config, config) for config in configs]):
+                results.append(future.result())
+                print(format_result(results[-1]))
+    return rank_results(results)
+
+
+def rank_results(results):
+    ranked = sorted(results, key=lambda result: (result["status"] != "ok", result.get("rmse", float("inf"))))
+    for rank, result in enumerate(ranked, 1):
+        result["rank"] = rank
+    return ranked
+
+
+def format_units(units):
+    return "-".join(str(size) for size in units)
+
+
+def format_result(result):
+    settings = (f"seq={result['sequence_length']} units={format_units(result['units'])} "
+                f"dropout={result['dropout']} epochs={result['epochs']} batch={result['batch_size']}")
+    if result["status"] != "ok":
+        return f"{settings}: {result['status']} ({result.get('reason')})"
+    return (f"{settings}: rmse={result['rmse']:.2f}h mae={result['mae']:.2f}h "
+            f"after {result['epochs_run']} epochs in {result['seconds']:.1f}s")
+
+
+def write_table(path, results):
+    """Writes the ranked results as a CSV table."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=TABLE_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for result in results:
+        writer.writerow({**result, "units": format_units(result["units"])})
+    write_atomic(path, buffer.getvalue(), "w")
+
+
+def parse_list(text, kind):
+    return [kind(value) for value in text.split(",") if value.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep LSTM hyperparameters over a process pool.")
+    parser.add_argument("source", help="Folder, glob, zip or advisory store to train on")
+    parser.add_argument("--sequence-lengths", default=",".join(map(str, DEFAULT_GRID["sequence_length"])))
+    parser.add_argument("--units", default=",".join(format_units(units) for units in DEFAULT_GRID["units"]),
+                        help="comma-separated layer sizes, e.g. 64-32,32-16,64")
+    parser.add_argument("--dropouts", default=",".join(map(str, DEFAULT_GRID["dropout"])))
+    parser.add_argument("--epochs", default=",".join(map(str, DEFAULT_GRID["epochs"])),
+                        help="maximum epochs; early stopping usually ends runs sooner")
+    parser.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_GRID["batch_size"])))
+    parser.add_argument("--samples", type=int, default=None,
+                        help="evaluate this many random combinations instead of the full grid")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None, help="TensorFlow threads per worker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    grid = {
+        "sequence_length": parse_list(args.sequence_lengths, int),
+        "units": [tuple(int(size) for size in units.split("-")) for units in args.units.split(",") if units],
+        "dropout": parse_list(args.dropouts, float),
+        "epochs": parse_list(args.epochs, int),
+        "batch_size": parse_list(args.batch_sizes, int),
+    }
+    configs = random_configs(grid, args.samples, args.seed) if args.samples else grid_configs(grid)
+
+    features, patch_times = extract_patch_times(load_data(args.source))
+    print(f"Sweeping {len(configs)} configurations over {len(patch_times)} patch times")
+    results = run_sweep(features, patch_times, configs, args.workers, args.threads, args.patience, args.seed)
+    write_table(args.output, results)
+    print(f"Wrote {len(results)} results to {args.output}")
+    for result in results[:5]:
+        print(f"#{result['rank']} {format_result(result)}")
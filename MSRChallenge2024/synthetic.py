@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from loader import split_chunks
+
+# Characters GitHub uses in GHSA ids
+GHSA_ALPHABET = "23456789cfghjmpqrvwx"
+SEVERITIES = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+SEVERITY_WEIGHTS = [10, 40, 35, 15]
+CWES = ["CWE-20", "CWE-22", "CWE-79", "CWE-89", "CWE-200", "CWE-284", "CWE-287", "CWE-352", "CWE-400",
+        "CWE-502", "CWE-611", "CWE-770", "CWE-787", "CWE-918", "CWE-1321"]
+GROUPS = ["org.apache.commons", "org.springframework", "com.fasterxml.jackson.core", "org.jenkins-ci.plugins",
+          "io.netty", "org.keycloak", "org.xwiki.platform", "com.google.protobuf", "org.eclipse.jetty",
+          "io.undertow", "org.apache.tomcat.embed", "org.bouncycastle", "org.yaml", "com.thoughtworks.xstream"]
+ARTIFACT_WORDS = ["core", "web", "api", "client", "server", "common", "parser", "security", "utils", "http",
+                  "xml", "json", "auth", "plugin", "engine", "databind", "codec", "transport"]
+QUALIFIERS = ["", "", "", "", "-RC1", "-beta", ".Final", "-alpha-2"]
+# Words the summaries and details are made of, so TF-IDF and LDA see a realistic vocabulary
+VOCABULARY = ("allows remote attacker execute arbitrary code via crafted request improper input validation "
+              "deserialization untrusted data denial service memory exhaustion cross site scripting injection "
+              "path traversal authentication bypass privilege escalation xml external entity server side "
+              "request forgery sensitive information exposure admin api session token header upload file "
+              "directory resource parsing payload serialized object plugin configuration endpoint user "
+              "password credentials leak vulnerable version fixed upgrade patch affected component").split()
+CVSS_METRICS = [("AV", "NALP"), ("AC", "LH"), ("PR", "NLH"), ("UI", "NR"), ("S", "UC"),
+                ("C", "NLH"), ("I", "NLH"), ("A", "NLH")]
+EPOCH = datetime(2017, 1, 1, tzinfo=timezone.utc)
+
+
+def ghsa_id(rng):
+    return "GHSA-" + "-".join("".join(rng.choice(GHSA_ALPHABET) for _ in range(4)) for _ in range(3))
+
+
+def timestamp(dt, fraction=False):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ" if fraction else "%Y-%m-%dT%H:%M:%SZ")
+
+
+def sentence(rng, low, high):
+    words = rng.choices(VOCABULARY, k=rng.randint(low, high))
+    return " ".join(words).capitalize() + "."
+
+
+def version(rng, major=None):
+    major = rng.randint(0, 12) if major is None else major
+    return f"{major}.{rng.randint(0, 30)}.{rng.randint(0, 20)}{rng.choice(QUALIFIERS)}"
+
+
+def cvss_vector(rng):
+    parts = [f"{name}:{rng.choice(values)}" for name, values in CVSS_METRICS]
+    return f"CVSS:3.{rng.randint(0, 1)}/" + "/".join(parts)
+
+
+def generate_advisory(seed, index):
+    """Builds one GHSA-shaped OSV advisory. The same (seed, index) always gives the same advisory."""
+    rng = random.Random(seed * 1_000_003 + index)
+    advisory_id = ghsa_id(rng)
+    published = EPOCH + timedelta(seconds=rng.randint(0, 7 * 365 * 86400))
+    nvd_published = published - timedelta(hours=rng.randint(0, 24 * 60))
+    reviewed = published + timedelta(hours=rng.randint(0, 24 * 30))
+    modified = reviewed + timedelta(days=rng.randint(0, 400))
+    cve = f"CVE-{nvd_published.year}-{rng.randint(1000, 99999)}"
+
+    affected = []
+    for _ in range(rng.choices([1, 2, 3], [80, 15, 5])[0]):
+        group = rng.choice(GROUPS)
+        artifact = "-".join(rng.sample(ARTIFACT_WORDS, rng.randint(1, 2)))
+        major = rng.randint(0, 12)
+        events = [{"introduced": rng.choice(["0", version(rng, major)])}]
+        # Most ranges end in a fixed version; some are still open, a few end in last_affected
+        kind = rng.choices(["fixed", "open", "last_affected"], [80, 12, 8])[0]
+        if kind != "open":
+            events.append({kind: version(rng, major + 1)})
+        affected.append({
+            "package": {"name": f"{group}:{artifact}", "ecosystem": "Maven",
+                        "purl": f"pkg:maven/{group}/{artifact}"},
+            "ranges": [{"type": "ECOSYSTEM", "events": events}],
+            "versions": sorted({version(rng, major) for _ in range(rng.randint(0, 60))}),
+            "database_specific": {"source": f"https://github.com/github/advisory-database/blob/main/advisories/"
+                                            f"github-reviewed/{published:%Y/%m}/{advisory_id}/{advisory_id}.json"},
+        })
+
+    advisory = {
+        "id": advisory_id,
+        "summary": sentence(rng, 5, 14),
+        "details": " ".join(sentence(rng, 8, 30) for _ in range(rng.randint(2, 40))),
+        "aliases": [cve] if rng.random() < 0.9 else [],
+        "modified": timestamp(modified, fraction=True),
+        "published": timestamp(published),
+        "database_specific": {
+            "nvd_published_at": timestamp(nvd_published) if rng.random() < 0.85 else None,
+            "github_reviewed_at": timestamp(reviewed),
+            "severity": rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0],
+            "github_reviewed": True,
+            "cwe_ids": sorted(set(rng.sample(CWES, rng.choices([0, 1, 2], [10, 75, 15])[0]))),
+        },
+        "references": [{"type": "ADVISORY", "url": f"https://nvd.nist.gov/vuln/detail/{cve}"},
+                       {"type": "PACKAGE", "url": f"https://github.com/{affected[0]['package']['name']}"}],
+        "affected": affected,
+        "schema_version": "1.6.0",
+    }
+    if rng.random() < 0.8:
+        advisory["severity"] = [{"type": "CVSS_V3", "score": cvss_vector(rng)}]
+    return advisory
+
+
+def write_chunk(folder, seed, indices):
+    """Writes the advisories of some indices as <id>.json files and returns their aliases."""
+    aliases = []
+    for index in indices:
+        advisory = generate_advisory(seed, index)
+        with open(os.path.join(folder, advisory["id"] + ".json"), "w") as f:
+            json.dump(advisory, f, indent=2)
+        aliases.extend(advisory["aliases"])
+    return aliases
+
+
+def write_dataset(folder, count, seed=0, workers=None):
+    """Generates count advisories as one JSON file each and returns every CVE alias used."""
+    os.makedirs(folder, exist_ok=True)
+    chunks = split_chunks(list(range(count)), 1000)
+    if workers == 1 or len(chunks) <= 1:
+        return [alias for chunk in chunks for alias in write_chunk(folder, seed, chunk)]
+    aliases = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_aliases in pool.map(partial(write_chunk, folder, seed), chunks):
+            aliases.extend(chunk_aliases)
+    return aliases
+
+
+def write_filtered_data(path, cves, seed=0, extra=0.5):
+    """Writes a "Filtered Data.json"-style export mentioning the given CVEs plus some unknown ones."""
+    rng = random.Random(seed)
+    rows = [{"Artifact": f"{rng.choice(GROUPS)}:{rng.choice(ARTIFACT_WORDS)}:{version(rng)}",
+             "Severity": rng.choice(SEVERITIES), "CVE": cve, "CWE_IDs": f"[{rng.choice(CWES)}]"}
+            for cve in cves + [f"CVE-2099-{i}" for i in range(int(len(cves) * extra))]]
+    with open(path, "w") as f:
+        json.dump(rows, f, indent=4)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic GHSA/OSV advisories.")
+    parser.add_argument("folder", help="output folder")
+    parser.add_argument("count", type=int, help="number of advisories")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--filtered-data", default=None, help="also write a Filtered Data.json-style export here")
+    args = parser.parse_args()
+
+    cve_aliases = write_dataset(args.folder, args.count, args.seed, args.workers)
+    print(f"Wrote {args.count} advisories to {args.folder}")
+    if args.filtered_data:
+        rows = write_filtered_data(args.filtered_data, cve_aliases[::2], args.seed)
+        print(f"Wrote {rows} rows to {args.filtered_data}")
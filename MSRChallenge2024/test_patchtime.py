@@ -0,0 +1,22 @@
+import pytest
+
+from patchtime import patch_time_stats
+
+
+def advisories():
+    # The first advisory dates version 1.0.0; the second is fixed by a timestamp a day after it was published
+    yield {"id": "GHSA-1", "published": "2023-01-01T00:00:00Z",
+           "affected": [{"ranges": [{"events": [{"introduced": "0"}, {"fixed": "1.0.0"}]}]}]}
+    yield {"id": "GHSA-2", "published": "2023-01-02T00:00:00Z",
+           "affected": [{"ranges": [{"events": [{"introduced": "0"}, {"fixed": "2023-01-03T00:00:00Z"}]}]}]}
+    yield {"id": "GHSA-3", "published": "2023-01-03T00:00:00Z",
+           "affected": [{"ranges": [{"events": [{"introduced": "0"}, {"fixed": "1.0.0"}]}]}]}
+
+
+def test_patch_time_stats_reads_a_generator_once():
+    stats, skipped = patch_time_stats(advisories(), unit="days")
+    expected, expected_skipped = patch_time_stats(list(advisories()), unit="days")
+
+    assert stats.count == expected.count == 2
+    assert stats.summary()["mean"] == pytest.approx(expected.summary()["mean"]) == pytest.approx(0.5)
+    assert skipped == expected_skipped == [("GHSA-3", "Fixed date is earlier than published date")]
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from loader import load_json_files
+from patchtime import patch_time_stats
+from rollupcube import CUBE_FIELDS, RollupCube
+from shardmerge import find_shards, merge_shards, write_shard
+from sharding import shard_of
+
+NUM_SHARDS = 3
+
+
+def write_advisories(folder, fixed_of):
+    """Writes one advisory file per id, published a day apart, with fixed_of(i) as its fixed event."""
+    for i in range(40):
+        advisory = {
+            "id": f"GHSA-test-{i:04d}",
+            "published": f"2023-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00Z",
+            "database_specific": {"severity": ["LOW", "MODERATE", "HIGH"][i % 3], "cwe_ids": [f"CWE-{i % 4}"]},
+            "affected": [{"package": {"name": f"org.example:lib{i % 2}"},
+                          "ranges": [{"events": [{"introduced": "0"}, {"fixed": fixed_of(i)}]}]}],
+        }
+        (folder / f"{advisory['id']}.json").write_text(json.dumps(advisory))
+
+
+def run_sharded(folder, prefix):
+    for index in range(NUM_SHARDS):
+        data_list, errors = load_json_files(str(folder), flatten=True, fields=CUBE_FIELDS,
+                                            shard=(index, NUM_SHARDS))
+        assert not errors
+        stats, _ = patch_time_stats(data_list, unit="minutes")
+        write_shard(prefix, (index, NUM_SHARDS), data_list, stats, "minutes")
+    return merge_shards(prefix)
+
+
+def run_unsharded(folder):
+    data_list, errors = load_json_files(str(folder), flatten=True, fields=CUBE_FIELDS)
+    assert not errors
+    cube = RollupCube("minutes")
+    cube.update(data_list)
+    return cube, patch_time_stats(data_list, unit="minutes")[0]
+
+
+def assert_same(merged_cube, merged_stats, cube, stats):
+    assert merged_stats.count == stats.count
+    summary, merged_summary = stats.summary(), merged_stats.summary()
+    for key in ("mean", "std", "min", "max", "p50", "p90"):
+        assert merged_summary[key] == pytest.approx(summary[key])
+    for by in ([], ["month"], ["severity", "cwe"]):
+        expected, actual = cube.query(by), merged_cube.query(by)
+        assert actual.keys() == expected.keys()
+        for key, measures in expected.items():
+            assert actual[key] == pytest.approx(measures, nan_ok=True)
+
+
+def test_merged_shards_equal_unsharded_run_when_versions_span_shards(tmp_path):
+    folder = tmp_path / "advisories"
+    folder.mkdir()
+    # Every fifth advisory has a fix timestamp; the others share five versions dated by their
+    # earliest advisory, which is usually in another shard
+    write_advisories(folder, lambda i: f"2023-12-{1 + i % 28:02d}T00:00:00Z" if i % 5 == 0 else f"1.{i % 5}.0")
+    shards = {shard_of(f"GHSA-test-{i:04d}", NUM_SHARDS) for i in range(40) if i % 5 == 1}
+    assert len(shards) > 1
+
+    merged_cube, merged_stats, settings = run_sharded(folder, str(tmp_path / "run"))
+    cube, stats = run_unsharded(folder)
+
+    assert settings["unit"] == "minutes"
+    assert_same(merged_cube, merged_stats, cube, stats)
+
+
+def test_merged_shards_equal_unsharded_run_with_independent_shards(tmp_path):
+    folder = tmp_path / "advisories"
+    folder.mkdir()
+    write_advisories(folder, lambda i: f"2023-12-{1 + i % 28:02d}T{i % 24:02d}:30:00Z")
+
+    merged_cube, merged_stats, _ = run_sharded(folder, str(tmp_path / "run"))
+    cube, stats = run_unsharded(folder)
+
+    assert_same(merged_cube, merged_stats, cube, stats)
+
+
+def test_missing_shard_is_an_error(tmp_path):
+    folder = tmp_path / "advisories"
+    folder.mkdir()
+    write_advisories(folder, lambda i: "1.0.0")
+    run_sharded(folder, str(tmp_path / "run"))
+    (tmp_path / "run-1of3.json").unlink()
+
+    with pytest.raises(ValueError, match=r"Missing shards \[1\]"):
+        find_shards(str(tmp_path / "run"))
@@ -1,59 +1,47 @@
-import json
-import glob
-from datetime import datetime
+import argparse
+
+from loader import load_json_files
+from patchtime import patch_time_stats
+from rejectlog import DEFAULT_REJECT_LOG, RejectLog
+from shardmerge import add_shard_arguments, write_shard
+from streamstats import format_summary
+from versiondates import add_resolver_arguments, resolver_from_args
 
 # Directory containing JSON files
 json_folder_path = "/Users/jaydencruz/PycharmProjects/MSRChallenge/Kimberly'sFiles"
 
-# List to store patch times (in days)
-patch_times = []
-
-# Iterate through all JSON files
-json_files = glob.glob(f"{json_folder_path}/*.json")
-
-for file_path in json_files:
-    try:
-        # Load the JSON data
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-
-        # Extract the published date
-        published_date = data.get("published")
-        if not published_date:
-            print(f"Skipping {file_path}: 'published' date not found.")
-            continue
-
-        # Extract fixed version information
-        fixed_version_date = None
-        for range_info in data.get("affected", [{}])[0].get("ranges", []):
-            fixed = range_info.get("fixed")
-            if fixed:
-                fixed_version_date = range_info.get("introduced")  # Example placeholder for 'fixed_date'
-                break
-
-        # Validate the fixed date
-        if not fixed_version_date:
-            print(f"Skipping {file_path}: 'fixed version date' not found.")
-            continue
-
-        # Normalize the dates to datetime objects
-        published_date = datetime.fromisoformat(published_date.replace("Z", "+00:00"))
-        fixed_date = datetime.fromisoformat(fixed_version_date.replace("Z", "+00:00"))
-
-        # Calculate the patch time in days
-        patch_time = (fixed_date - published_date).days
-        patch_times.append(patch_time)
-
-    except KeyError as e:
-        print(f"Error in {file_path}: Missing key - {e}")
-    except ValueError as e:
-        print(f"Error in {file_path}: Invalid date format - {e}")
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-
-# Calculate and display the average patch time
-if patch_times:
-    average_patch_time = sum(patch_times) / len(patch_times)
-    print(f"\nAverage time to patch vulnerabilities: {average_patch_time:.2f} days")
-else:
-    print("\nNo valid patch times found.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Average patch time in days of a folder of advisories.")
+    parser.add_argument("source", nargs="?", default=json_folder_path, help="Folder, glob, zip or advisory store")
+    add_resolver_arguments(parser)
+    add_shard_arguments(parser, "time-shard")
+    args = parser.parse_args()
+    # Resolves fixed versions to release dates when release data is given
+    resolver = resolver_from_args(args)
+
+    # Load all JSON files, keeping only the fields needed for the patch time
+    data_list, load_errors = load_json_files(args.source,
+                                             fields="id, published, affected.package.name, affected.ranges.events",
+                                             shard=args.shard)
+    for file_path, error in load_errors:
+        print(f"Error processing {file_path}: {error}")
+
+    # Patch time in whole days between the published date and the fixed version's date, streamed
+    # through the engine into its statistics
+    with RejectLog(DEFAULT_REJECT_LOG, source="time") as reject_log:
+        stats, _ = patch_time_stats(data_list, unit="days", whole=True, resolver=resolver, reject_log=reject_log)
+    # A shard's results go to files that shardmerge.py combines into those of the whole dataset
+    if args.shard:
+        write_shard(args.shard_output, args.shard, data_list, stats, "days", whole=True, resolver=resolver)
+    if resolver:
+        resolver.save_cache()
+    if reject_log.total:
+        print(f"Skipped entries (see {DEFAULT_REJECT_LOG}):\n{reject_log.summary()}")
+
+    # Calculate and display the average patch time
+    if stats.count:
+        summary = stats.summary()
+        print(f"\nAverage time to patch vulnerabilities: {summary['mean']:.2f} days")
+        print(f"Distribution: {format_summary(summary, 'days')}")
+    else:
+        print("\nNo valid patch times found.")
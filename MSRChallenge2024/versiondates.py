@@ -0,0 +1,185 @@
+import csv
+import json
+import os
+import re
+from bisect import bisect_left
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from manifest import write_atomic
+
+# Qualifier order used by Maven's ComparableVersion; "" is a plain release.
+# Unknown qualifiers (e.g. the "v" of 9.4.6.v20170531) sort after all of these.
+QUALIFIER_RANKS = {"alpha": 0, "beta": 1, "milestone": 2, "rc": 3, "snapshot": 4, "": 5, "sp": 6}
+QUALIFIER_ALIASES = {"a": "alpha", "b": "beta", "m": "milestone", "cr": "rc",
+                     "ga": "", "final": "", "release": ""}
+UNKNOWN_QUALIFIER_RANK = 7
+
+# Digit runs, letter runs, separators
+VERSION_TOKENS = re.compile(r"\d+|[a-z]+|[.\-_+]")
+
+# Closes every key, so "1" compares like "1" followed by a plain-release qualifier
+END = (0, QUALIFIER_RANKS[""], "")
+
+
+@lru_cache(maxsize=1 << 20)
+def maven_version_key(version):
+    """Sort key following Maven version ordering.
+
+    1.0-alpha-1 < 1.0-beta < 1.0-rc-1 < 1.0-SNAPSHOT < 1.0 = 1.0.0 = 1.Final < 1.0-sp
+    < 1.0.v20170531 < 1.0.1. Numbers compare numerically and rank above qualifiers.
+    """
+    tokens = [token for token in VERSION_TOKENS.findall(version.lower()) if token not in ".-_+"]
+    items = []
+    for i, token in enumerate(tokens):
+        if token.isdigit():
+            items.append((1, int(token), ""))
+            continue
+        # A single a/b/m is only alpha/beta/milestone when directly followed by a number
+        if len(token) > 1 or (i + 1 < len(tokens) and tokens[i + 1].isdigit()):
+            token = QUALIFIER_ALIASES.get(token, token)
+        rank = QUALIFIER_RANKS.get(token, UNKNOWN_QUALIFIER_RANK)
+        items.append((0, rank, token if rank == UNKNOWN_QUALIFIER_RANK else ""))
+
+    # Zeros and plain-release qualifiers before a qualifier or the end carry no
+    # meaning (1.0.0-rc == 1-rc, 1.0.Final == 1), so drop them
+    trimmed = []
+    for item in items + [END]:
+        if item[0] == 0:
+            while trimmed and (trimmed[-1] == (1, 0, "") or trimmed[-1] == END):
+                trimmed.pop()
+        trimmed.append(item)
+    return tuple(trimmed)
+
+
+def timestamp_to_iso(value):
+    """Converts epoch milliseconds (Goblin's release timestamps) or an ISO date to the OSV format."""
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        dt = datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value
+
+
+def split_release_id(release_id):
+    """Splits a Goblin release id "groupId:artifactId:version" into ("groupId:artifactId", version)."""
+    package, _, version = release_id.rpartition(":")
+    return package, version
+
+
+class VersionDateResolver:
+    """Release dates per artifact, sorted in Maven version order and searched with bisect."""
+
+    def __init__(self, cache_path=None):
+        self.releases = {}  # package -> list of (key, version, date), sorted on demand
+        self.sorted = set()
+        self.cache_path = cache_path
+        self.cache = {}
+        self.cache_dirty = False
+        # Unresolved pairs are only remembered until the release data changes, and never persisted
+        self.misses = set()
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                # Older caches also stored misses as null; those are looked up again
+                self.cache = {key: date for key, date in json.load(f).items() if date is not None}
+
+    def add(self, package, version, date):
+        """Records the release date of one version ("" as package means any artifact)."""
+        self.releases.setdefault(package, []).append((maven_version_key(version), version, date))
+        self.sorted.discard(package)
+        self.misses.clear()
+
+    def release_list(self, package):
+        releases = self.releases.get(package)
+        if releases is None:
+            return None
+        if package not in self.sorted:
+            releases.sort(key=lambda release: release[0])
+            self.sorted.add(package)
+        return releases
+
+    def lookup(self, package, version, next_release=False):
+        """Binary-searches one artifact's releases for a version.
+
+        With next_release=True a version that was never released resolves to the
+        first release that sorts after it.
+        """
+        releases = self.release_list(package)
+        if not releases:
+            return None
+        key = maven_version_key(version)
+        i = bisect_left(releases, key, key=lambda release: release[0])
+        if i < len(releases) and (releases[i][0] == key or next_release):
+            return releases[i][2]
+        return None
+
+    def resolve(self, package, version, next_release=False):
+        """Returns the release date of package:version (falling back to package-less dates), or None."""
+        cache_key = f"{package}|{version}|{int(next_release)}"
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+        if cache_key in self.misses:
+            return None
+        date = self.lookup(package, version, next_release) if package else None
+        if date is None:
+            date = self.lookup("", version)
+        if date is None:
+            self.misses.add(cache_key)
+            return None
+        self.cache[cache_key] = date
+        self.cache_dirty = True
+        return date
+
+    def save_cache(self):
+        """Persists the resolved (package, version) pairs for the next run (misses are not kept)."""
+        if self.cache_path and self.cache_dirty:
+            write_atomic(self.cache_path, json.dumps(self.cache, sort_keys=True), "w")
+            self.cache_dirty = False
+
+
+def load_goblin_releases(resolver, csv_path):
+    """Feeds a Goblin Release export (CSV with id/gav and timestamp columns) into the resolver."""
+    with open(csv_path, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        fields = {name.lower().strip(): name for name in reader.fieldnames or []}
+        id_field = fields.get("id") or fields.get("gav") or fields.get("release")
+        date_field = fields.get("timestamp") or fields.get("date") or fields.get("released")
+        if id_field is None or date_field is None:
+            raise ValueError(f"{csv_path} needs an id (groupId:artifactId:version) and a timestamp column")
+        count = 0
+        for row in reader:
+            if not row[id_field] or not row[date_field]:
+                continue
+            package, version = split_release_id(row[id_field])
+            resolver.add(package, version, timestamp_to_iso(row[date_field]))
+            count += 1
+    return count
+
+
+def load_version_date_mapping(resolver, json_path, package=""):
+    """Feeds a {version: date} file like version_date_mapping.json into the resolver."""
+    with open(json_path, "r") as f:
+        mapping = json.load(f)
+    for version, date in mapping.items():
+        resolver.add(package, version, timestamp_to_iso(date))
+    return len(mapping)
+
+
+def add_resolver_arguments(parser):
+    """Adds the options that feed a VersionDateResolver to a script's argument parser."""
+    parser.add_argument("--releases", action="append", default=[],
+                        help="Goblin release export (CSV with id and timestamp columns); may be repeated")
+    parser.add_argument("--version-dates", action="append", default=[],
+                        help="{version: date} JSON file such as version_date_mapping.json; may be repeated")
+    parser.add_argument("--resolver-cache", default=None, help="JSON file keeping resolved dates between runs")
+
+
+def resolver_from_args(args):
+    """Builds the resolver asked for on the command line, or None when no release data was given."""
+    if not args.releases and not args.version_dates:
+        return None
+    resolver = VersionDateResolver(args.resolver_cache)
+    for csv_path in args.releases:
+        load_goblin_releases(resolver, csv_path)
+    for json_path in args.version_dates:
+        load_version_date_mapping(resolver, json_path)
+    return resolver